@@ -1,9 +1,16 @@
-import subprocess
-from database import fetch_all, execute_query
+from database import fetch_all, execute_query, get_pool_stats, get_cache_stats, get_query_stats, query_cache, query_stats, unit_of_work
 import streamlit as st
 import pandas as pd
 from decimal import Decimal
+import datetime
 import json
+from teams import search_teams_db
+from details import SUMMARY_COLUMNS, summarize_details
+from importer import IMPORT_TABLES, ImportValidationError, import_file
+from exporter import EXPORT_DIR, export_database
+from investments import calculate_users_stats
+from auth import get_auth_stats
+from tracing import span, summarize, to_chrome_trace, traced, tracer
 
 def custom_serializer(obj):
     """自定义 JSON 序列化器"""
@@ -11,45 +18,381 @@ def custom_serializer(obj):
         return float(obj)  # 将 Decimal 转换为浮点数
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
-def backup_database():
+# 批量录入表格中的类别 -> 持仓表
+BULK_ENTRY_TABLES = {"虚拟币": "crypto_investments", "股票": "stock_investments"}
+BULK_ENTRY_COLUMNS = ["user_id", "sub_type", "buy_price", "quantity", "investment_date"]
+# 批量录入的体育类博彩注单写入 investments 的列（摘要列与单条录入一样在写入时生成）
+BULK_BET_COLUMNS = [
+    "user_id", "investment_type", "sub_type", "amount", "return_amount", "investment_date", "details", *SUMMARY_COLUMNS
+]
+
+# 页面上备份时等待进行中的写事务结束的最长秒数：在脚本线程中执行，不能像定时任务那样等待 EXPORT_SETTLE_TIMEOUT
+ADMIN_EXPORT_SETTLE_TIMEOUT = 2
+
+# 排行榜读取的表：其中任何一张被写入后，会话中保存的排行榜作废
+LEADERBOARD_TABLES = ("users", "investments", "crypto_investments", "stock_investments")
+
+def submit_bulk_lots(user_id, grid):
+    """
+    把批量录入表格中的持仓在一个事务中写入（每张表一条多行 INSERT）
+    :param grid: st.data_editor 返回的 DataFrame，列为 类别、代码、买入价格、数量、投资日期
+    :return: (按表名分组的新记录 id, 错误信息列表)；有错误时不写入任何数据
+    """
+    rows_by_table = {}
+    errors = []
+    for i, row in enumerate(grid.dropna(how="all").itertuples(index=False), start=1):
+        category, symbol, buy_price, quantity, investment_date = row
+        if category not in BULK_ENTRY_TABLES:
+            errors.append(f"第 {i} 行: 请选择类别")
+            continue
+        if not isinstance(symbol, str) or not symbol.strip():
+            errors.append(f"第 {i} 行: 代码不能为空")
+            continue
+        if pd.isna(buy_price) or pd.isna(quantity) or buy_price <= 0 or quantity <= 0:
+            errors.append(f"第 {i} 行: 买入价格和数量必须大于 0")
+            continue
+        if pd.isna(investment_date):
+            errors.append(f"第 {i} 行: 请选择投资日期")
+            continue
+        rows_by_table.setdefault(BULK_ENTRY_TABLES[category], []).append((
+            user_id, symbol.strip().upper(), Decimal(str(buy_price)), Decimal(str(quantity)), investment_date
+        ))
+    if errors or not rows_by_table:
+        return {}, errors
+
+    with unit_of_work() as uow:
+        inserted = {
+            table: uow.insert_many(table, BULK_ENTRY_COLUMNS, rows)
+            for table, rows in rows_by_table.items()
+        }
+    return inserted, []
+
+def _find_teams(names):
+    """按英文名（不区分大小写）或中文名精确查找球队，返回 {输入的名称: 球队}"""
+    names = set(names)
+    if not names:
+        return {}
+    rows = fetch_all(
+        """
+        SELECT english_name, chinese_name FROM teams
+        WHERE lower(english_name) = ANY(%s) OR chinese_name = ANY(%s)
+        ORDER BY id
+        """,
+        ([name.lower() for name in names], list(names)), cache_tables=("teams",)
+    )
+    teams = {}
+    for name in names:
+        for row in rows:
+            if row["english_name"].lower() == name.lower() or row["chinese_name"] == name:
+                teams[name] = row
+                break
+    return teams
+
+def submit_bulk_bets(user_id, grid):
+    """
+    把批量录入表格中的体育类博彩注单在一个事务中写入（一条多行 INSERT）
+    每行一张注单，只记录选中的投注选项；details 与摘要列的格式与单条录入完全相同
+    :param grid: st.data_editor 返回的 DataFrame，列为 A队、B队、赛制、投注选项、赔率、押注金额、回报金额、投资日期
+    :return: (新记录 id 列表, 错误信息列表)；有错误时不写入任何数据
+    """
+    grid = grid.dropna(how="all")
+    team_names = {
+        name.strip() for column in ("A队", "B队") for name in grid[column]
+        if isinstance(name, str) and name.strip()
+    }
+    teams = _find_teams(team_names)
+    rows = []
+    errors = []
+    for i, row in enumerate(grid.itertuples(index=False), start=1):
+        team_a, team_b, game, bet_type, odds, amount, return_amount, investment_date = row
+        team_a = team_a.strip() if isinstance(team_a, str) else ""
+        team_b = team_b.strip() if isinstance(team_b, str) else ""
+        unknown = [name or "（空）" for name in (team_a, team_b) if name not in teams]
+        if unknown:
+            errors.append(f"第 {i} 行: 未找到球队 {', '.join(unknown)}")
+            continue
+        if not isinstance(bet_type, str) or not bet_type.strip():
+            errors.append(f"第 {i} 行: 投注选项不能为空")
+            continue
+        if pd.isna(odds) or pd.isna(amount) or odds <= 0 or amount <= 0:
+            errors.append(f"第 {i} 行: 赔率和押注金额必须大于 0")
+            continue
+        if pd.isna(investment_date):
+            errors.append(f"第 {i} 行: 请选择投资日期")
+            continue
+        amount = Decimal(str(amount))
+        return_amount = Decimal(str(return_amount)) if not pd.isna(return_amount) else Decimal("0")
+        details = {
+            "game": game.strip() if isinstance(game, str) else "",
+            "amount": float(amount),
+            "team_a": {key: teams[team_a][key] for key in ("english_name", "chinese_name")},
+            "team_b": {key: teams[team_b][key] for key in ("english_name", "chinese_name")},
+            "bet_options": [{"type": bet_type.strip(), "odds": float(odds), "selected": True}],
+            "selected_bet": bet_type.strip(),
+            "return_amount": float(return_amount)
+        }
+        details_json = json.dumps(details, default=custom_serializer)
+        summary = summarize_details(details_json)
+        rows.append((
+            user_id, "博彩", "体育类", amount, return_amount, investment_date, details_json,
+            *(summary[column] for column in SUMMARY_COLUMNS)
+        ))
+    if errors or not rows:
+        return [], errors
+
+    with unit_of_work() as uow:
+        ids = uow.insert_many("investments", BULK_BET_COLUMNS, rows)
+    return ids, []
+
+def backup_database(incremental=True, file_format="parquet"):
+    """导出数据库业务表（服务端游标分批读取，按水位线增量导出），并在页面上显示进度"""
+    progress_bar = st.progress(0.0)
+    progress_text = st.empty()
+
+    def report(table, exported, total):
+        progress_bar.progress(exported / total if total else 1.0)
+        progress_text.write(f"{table}: {exported}/{total} 行")
+
     try:
-        command = 'pg_dump -U postgres -d trackers -F c > trackers_backup.dump'
-        subprocess.run(command, shell=True, check=True)
-        st.success("数据库备份成功！备份文件为 trackers_backup.dump")
-    except subprocess.CalledProcessError as e:
+        progress_text.write("正在确认没有未结束的写事务...")
+        results = export_database(
+            incremental=incremental, file_format=file_format, progress=report,
+            settle_timeout=ADMIN_EXPORT_SETTLE_TIMEOUT
+        )
+        files = [result["file"] for result in results.values() if result["file"]]
+        total_rows = sum(result["rows"] for result in results.values())
+        st.success(f"数据库备份成功！共导出 {total_rows} 行，{len(files)} 个文件，目录: {EXPORT_DIR}")
+        deferred = [table for table, result in results.items() if result["deferred"]]
+        if deferred:
+            st.info(
+                f"{', '.join(deferred)} 有写事务在 {ADMIN_EXPORT_SETTLE_TIMEOUT} 秒内没有结束，"
+                "这些表只导出到已确认的位置，之后的新行会在下次增量备份中导出。"
+            )
+    except Exception as e:
         st.error(f"数据库备份失败: {e}")
 
+@traced()
 def admin_dashboard():
     """管理员面板"""
     st.success(f"欢迎回来, 管理员!")
 
     # 备份数据库按钮
-    if st.button("备份数据库"):
-        backup_database()
+    backup_cols = st.columns(3)
+    backup_mode = backup_cols[0].selectbox("备份方式", ["增量", "全量"], key="backup_mode")
+    backup_format = backup_cols[1].selectbox("文件格式", ["parquet", "csv"], key="backup_format")
+    if backup_cols[2].button("备份数据库"):
+        with span("backup_database"):
+            backup_database(incremental=backup_mode == "增量", file_format=backup_format)
+
+    # 数据库连接池状态
+    with st.expander("数据库连接池状态"), span("pool_stats"):
+        pool_stats = get_pool_stats()
+        if pool_stats:
+            st.table(pd.DataFrame(list(pool_stats.items()), columns=["指标", "数值"]))
+        else:
+            st.info("连接池尚未初始化。")
+
+    # 登录密码校验线程池状态
+    with st.expander("登录验证线程池状态"), span("auth_stats"):
+        st.table(pd.DataFrame(list(get_auth_stats().items()), columns=["指标", "数值"]))
+
+    # 查询结果缓存状态
+    with st.expander("查询缓存状态"), span("cache_stats"):
+        st.table(pd.DataFrame(list(get_cache_stats().items()), columns=["指标", "数值"]))
+
+    # 语句耗时统计与慢查询
+    with st.expander("查询统计"), span("query_stats"):
+        query_stats.enabled = st.toggle("记录语句耗时", value=query_stats.enabled, key="query_stats_enabled")
+        rerun = query_stats.rerun_stats()
+        if rerun:
+            st.caption(
+                f"本次页面运行到此处共执行 {rerun['queries']} 条语句（其中 {rerun['cache_hits']} 条命中缓存），"
+                f"耗时 {rerun['time_ms']} ms"
+            )
+        top_queries = get_query_stats()
+        if top_queries:
+            st.dataframe(pd.DataFrame(top_queries).drop(columns=["histogram"]).rename(columns={
+                "sql": "语句", "calls": "执行次数", "cache_hits": "缓存命中", "total_ms": "总耗时 (ms)",
+                "avg_ms": "平均 (ms)", "p95_ms": "P95 (ms)", "max_ms": "最大 (ms)",
+                "avg_rows": "平均行数", "avg_acquire_ms": "平均借连接 (ms)",
+            }))
+        else:
+            st.info("暂无统计数据，开启记录后刷新页面即可看到。")
+        slow_queries = query_stats.slow_queries()
+        if slow_queries:
+            st.write(f"最近的慢查询（超过 {query_stats.slow_ms:g} ms）:")
+            st.dataframe(pd.DataFrame(slow_queries))
+        if st.button("清空统计", key="reset_query_stats"):
+            query_stats.reset()
+            st.rerun()
+
+    # 页面耗时追踪（按 TRACE_SAMPLE_RATE 采样）
+    with st.expander("页面耗时追踪"):
+        tracer.sample_rate = st.slider("采样比例", 0.0, 1.0, float(tracer.sample_rate), 0.05, key="trace_sample_rate")
+        traces = tracer.recent()
+        if traces:
+            st.caption(f"最近 {len(traces)} 次被采样的页面运行（每个页面最多保留 {tracer.history} 次）")
+            st.dataframe(pd.DataFrame(summarize(traces)).rename(columns={
+                "span": "阶段", "calls": "次数", "wall_ms": "墙钟总耗时 (ms)", "cpu_ms": "CPU 总耗时 (ms)",
+                "avg_wall_ms": "平均墙钟耗时 (ms)",
+            }))
+            st.download_button(
+                "导出 Chrome Trace (JSON)", to_chrome_trace(traces),
+                file_name="trace.json", mime="application/json"
+            )
+        else:
+            st.info("暂无追踪数据，调高采样比例后刷新页面即可看到。")
+
+    # 用户排行榜（一次分组查询 + 一次取价）
+    # 折叠的 expander 中的代码每次 rerun 都会执行，排行榜只在点击按钮后计算；
+    # 结果保存在会话中，相关表被写入后丢弃，需要重新加载
+    with st.expander("用户排行榜"), span("leaderboard"):
+        versions = query_cache.versions(LEADERBOARD_TABLES)
+        loaded = st.session_state.get("leaderboard")
+        if loaded is not None and loaded["versions"] != versions:
+            loaded = st.session_state["leaderboard"] = None
+        if st.button("刷新排行榜" if loaded else "加载排行榜", key="load_leaderboard"):
+            loaded = st.session_state["leaderboard"] = {
+                "versions": versions,
+                "loaded_at": datetime.datetime.now(),
+                "frame": calculate_users_stats(),
+            }
+        if loaded is None:
+            st.caption("排行榜需要汇总所有用户的投资并查询当前价格，点击按钮后加载。")
+        elif loaded["frame"].empty:
+            st.info("暂无用户数据。")
+        else:
+            st.caption(f"加载于 {loaded['loaded_at']:%Y-%m-%d %H:%M:%S}")
+            leaderboard = loaded["frame"].rename(columns={
+                "username": "用户", "total_investment": "总投资", "total_return": "总回报",
+                "net_profit": "净收益", "roi": "ROI (%)", "crypto_value": "虚拟币市值",
+                "stock_value": "股票市值", "holdings_cost": "持仓成本", "holdings_value": "持仓市值",
+                "holdings_pnl": "持仓盈亏", "symbols": "持仓代码数",
+            }).drop(columns=["user_id"])
+            money_columns = ["总投资", "总回报", "净收益", "虚拟币市值", "股票市值", "持仓成本", "持仓市值", "持仓盈亏"]
+            leaderboard[money_columns] = leaderboard[money_columns].astype(float)
+            sort_column = st.selectbox("排序", ["净收益", "ROI (%)", "持仓市值", "持仓盈亏", "总投资"], key="leaderboard_sort")
+            st.dataframe(
+                leaderboard.sort_values(sort_column, ascending=False).style.format(
+                    {column: "${:,.2f}" for column in money_columns} | {"ROI (%)": "{:.2f}%"}
+                ),
+                use_container_width=True, hide_index=True
+            )
+
+    # 批量导入投资记录
+    with st.expander("批量导入投资记录（CSV / Parquet）"), span("bulk_import"):
+        import_table = st.selectbox("导入到", list(IMPORT_TABLES.keys()), key="import_table")
+        st.caption("列名: " + ", ".join(IMPORT_TABLES[import_table].keys()) + "（id 可省略，日期格式为 YYYY-MM-DD）")
+        uploaded_file = st.file_uploader("选择文件", type=["csv", "parquet"], key="import_file")
+        if uploaded_file is not None and st.button("开始导入"):
+            file_format = "parquet" if uploaded_file.name.endswith(".parquet") else "csv"
+            progress_text = st.empty()
+            try:
+                count = import_file(
+                    import_table, uploaded_file, file_format,
+                    progress=lambda n: progress_text.write(f"已导入 {n} 行...")
+                )
+                st.success(f"导入完成，共 {count} 行。")
+            except ImportValidationError as e:
+                st.error(str(e))
+                for error in e.errors:
+                    st.write(f"- {error}")
+            except Exception as e:
+                st.error(f"导入失败（已回滚）: {e}")
 
     # 录入新投资记录
     st.subheader("录入新投资记录")
-    users = fetch_all("SELECT id, username FROM users WHERE role != 'admin'")
+    with span("load_users"):
+        users = fetch_all("SELECT id, username FROM users WHERE role != 'admin'", cache_tables=("users",))
     user_options = {user["username"]: user["id"] for user in users}
 
     selected_user = st.selectbox("选择用户", list(user_options.keys()))
     user_id = user_options[selected_user]
 
+    # 批量录入持仓：多行一次提交，在同一个事务中写入
+    with st.expander("批量录入虚拟币 / 股票持仓"), span("bulk_entry"):
+        grid = st.data_editor(
+            pd.DataFrame({
+                "类别": pd.Series(dtype="object"),
+                "代码": pd.Series(dtype="object"),
+                "买入价格": pd.Series(dtype="float64"),
+                "数量": pd.Series(dtype="float64"),
+                "投资日期": pd.Series(dtype="object"),
+            }),
+            num_rows="dynamic",
+            key="bulk_entry_grid",
+            column_config={
+                "类别": st.column_config.SelectboxColumn(options=list(BULK_ENTRY_TABLES), required=True),
+                "买入价格": st.column_config.NumberColumn(min_value=0.0, format="%.8f"),
+                "数量": st.column_config.NumberColumn(min_value=0.0, format="%.8f"),
+                "投资日期": st.column_config.DateColumn(required=True),
+            },
+        )
+        if st.button("全部提交", key="bulk_entry_submit"):
+            try:
+                inserted, errors = submit_bulk_lots(user_id, grid)
+            except Exception as e:
+                st.error(f"写入失败（已回滚）: {e}")
+            else:
+                if errors:
+                    for error in errors:
+                        st.error(error)
+                elif not inserted:
+                    st.warning("表格中没有需要提交的记录。")
+                else:
+                    total = sum(len(ids) for ids in inserted.values())
+                    st.success(f"已在一个事务中写入 {total} 条记录。")
+                    for table, ids in inserted.items():
+                        st.write(f"{table}: 新记录 id {', '.join(map(str, ids))}")
+
+    # 批量录入体育类博彩注单：球队按名称精确匹配，每行记录选中的投注选项
+    with st.expander("批量录入体育类博彩注单"), span("bulk_bets"):
+        bet_grid = st.data_editor(
+            pd.DataFrame({
+                "A队": pd.Series(dtype="object"),
+                "B队": pd.Series(dtype="object"),
+                "赛制": pd.Series(dtype="object"),
+                "投注选项": pd.Series(dtype="object"),
+                "赔率": pd.Series(dtype="float64"),
+                "押注金额": pd.Series(dtype="float64"),
+                "回报金额": pd.Series(dtype="float64"),
+                "投资日期": pd.Series(dtype="object"),
+            }),
+            num_rows="dynamic",
+            key="bulk_bet_grid",
+            column_config={
+                "A队": st.column_config.TextColumn(help="球队英文名或中文名", required=True),
+                "B队": st.column_config.TextColumn(help="球队英文名或中文名", required=True),
+                "赔率": st.column_config.NumberColumn(min_value=0.0, format="%.2f"),
+                "押注金额": st.column_config.NumberColumn(min_value=0.0, format="%.2f"),
+                "回报金额": st.column_config.NumberColumn(min_value=0.0, format="%.2f"),
+                "投资日期": st.column_config.DateColumn(required=True),
+            },
+        )
+        if st.button("全部提交", key="bulk_bet_submit"):
+            try:
+                ids, errors = submit_bulk_bets(user_id, bet_grid)
+            except Exception as e:
+                st.error(f"写入失败（已回滚）: {e}")
+            else:
+                if errors:
+                    for error in errors:
+                        st.error(error)
+                elif not ids:
+                    st.warning("表格中没有需要提交的注单。")
+                else:
+                    st.success(f"已在一个事务中写入 {len(ids)} 张注单，新记录 id {', '.join(map(str, ids))}")
+
     investment_type = st.selectbox("投资类型", ["股票", "黄金", "期货", "博彩", "虚拟币"])  # 新增 "虚拟币"
 
     if investment_type == "博彩":
         sub_type = st.selectbox("博彩子类型", ["体育类", "Casino 类"])
 
         if sub_type == "体育类":
-            # 查询所有队伍信息
-            teams = fetch_all("SELECT id, english_name, chinese_name FROM teams")
-
             # 动态文本框：对阵双方 - A队
             team_a_search = st.text_input("对阵双方 - A队（输入英文或中文名称）")
-            filtered_teams_a = [
-                team for team in teams
-                if team_a_search.lower() in team["english_name"].lower() or team_a_search.lower() in team["chinese_name"].lower()
-            ]
+            with span("search_teams"):
+                filtered_teams_a = search_teams_db(team_a_search)
             team_a_options = {f"{team['english_name']} ({team['chinese_name']})": team for team in filtered_teams_a}
 
             if team_a_options:
@@ -61,10 +404,8 @@ def admin_dashboard():
 
             # 动态文本框：对阵双方 - B队
             team_b_search = st.text_input("对阵双方 - B队（输入英文或中文名称）")
-            filtered_teams_b = [
-                team for team in teams
-                if team_b_search.lower() in team["english_name"].lower() or team_b_search.lower() in team["chinese_name"].lower()
-            ]
+            with span("search_teams"):
+                filtered_teams_b = search_teams_db(team_b_search)
             team_b_options = {f"{team['english_name']} ({team['chinese_name']})": team for team in filtered_teams_b}
 
             if team_b_options:
@@ -131,13 +472,17 @@ def admin_dashboard():
 
             # 插入博彩记录
             if st.button("提交"):
-                query = """
-                    INSERT INTO investments (user_id, investment_type, sub_type, amount, return_amount, investment_date, details)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                # 写入时同时保存渲染好的摘要和提取出的球队、赛制等列
+                details_json = json.dumps(details, default=custom_serializer)
+                summary = summarize_details(details_json)
+                query = f"""
+                    INSERT INTO investments (user_id, investment_type, sub_type, amount, return_amount, investment_date, details,
+                                             {', '.join(SUMMARY_COLUMNS)})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, {', '.join(['%s'] * len(SUMMARY_COLUMNS))})
                 """
                 execute_query(query, (
                     user_id, "博彩", sub_type, str(amount), str(return_amount),
-                    investment_date, json.dumps(details, default=custom_serializer)
+                    investment_date, details_json, *(summary[column] for column in SUMMARY_COLUMNS)
                 ))
 
                 st.success("博彩投资记录已成功添加到数据库！")
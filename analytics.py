@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+from database import fetch_all, get_connection, on_table_change, open_transactions, transactions_running
+
+ROLLUP_MAX_AGE = float(os.getenv("ROLLUP_MAX_AGE", "60"))  # 距上次刷新超过该秒数时，查询前先增量刷新
+
+# 来源表 -> 映射到预聚合列的 SELECT 片段（investment_type, sub_type, amount, return_amount）
+ROLLUP_SOURCES = {
+    "investments": """
+        investment_type, COALESCE(sub_type, '') AS sub_type,
+        amount, COALESCE(return_amount, 0) AS return_amount
+    """,
+    "crypto_investments": """
+        '虚拟币' AS investment_type, UPPER(TRIM(sub_type)) AS sub_type,
+        buy_price * quantity AS amount, NULL::numeric AS return_amount
+    """,
+    "stock_investments": """
+        '股票' AS investment_type, UPPER(TRIM(sub_type)) AS sub_type,
+        buy_price * quantity AS amount, NULL::numeric AS return_amount
+    """,
+}
+
+_state_lock = threading.Lock()
+_dirty = True  # 来源表被写入后置为 True
+_refreshed_at = 0.0
+
+
+def _mark_dirty():
+    global _dirty
+    with _state_lock:
+        _dirty = True
+
+
+for _source in ROLLUP_SOURCES:
+    on_table_change(_source, _mark_dirty)
+
+
+def _aggregate_sql(source, select, id_filter):
+    return f"""
+        SELECT user_id, investment_type, sub_type, date_trunc('month', investment_date)::date AS month,
+               COUNT(*) AS lot_count, COALESCE(SUM(amount), 0) AS total_amount, SUM(return_amount) AS total_return
+        FROM (
+            SELECT user_id, investment_date, {select}
+            FROM {source}
+            WHERE {id_filter}
+        ) AS source_rows
+        GROUP BY user_id, investment_type, sub_type, date_trunc('month', investment_date)
+    """
+
+
+def _refresh_source(cursor, source, select):
+    """
+    两步推进一个来源表的水位线
+    自增 id 在事务提交之前就已分配，读到 MAX(id) 时，更小的 id 可能还属于未提交的事务
+    （例如正在进行的大批量 COPY 导入）。所以每次刷新只记下待确认的最大 id 和当时所有进行中事务的
+    虚拟事务号（pg_locks 中每个事务都持有自己的 virtualxid 锁，包括还没有分配事务号的事务）；
+    等这些事务全部结束，不会再有 id 不超过它的行提交时，下一次刷新才把这段区间计入预聚合表。
+    :return: 本次计入预聚合表的分组数
+    """
+    cursor.execute(
+        "INSERT INTO rollup_watermarks (source) VALUES (%s) ON CONFLICT (source) DO NOTHING",
+        (source,)
+    )
+    cursor.execute(
+        "SELECT last_id, pending_id, pending_vxids FROM rollup_watermarks WHERE source = %s FOR UPDATE",
+        (source,)
+    )
+    last_id, pending_id, pending_vxids = cursor.fetchone()
+
+    settled = 0
+    if pending_id is not None:
+        if transactions_running(cursor, pending_vxids):
+            return 0
+        cursor.execute(f"""
+            INSERT INTO investment_rollups
+                (source, user_id, investment_type, sub_type, month, lot_count, total_amount, total_return)
+            SELECT %s, * FROM ({_aggregate_sql(source, select, "id > %s AND id <= %s")}) AS new_rows
+            ON CONFLICT (source, user_id, investment_type, sub_type, month) DO UPDATE SET
+                lot_count = investment_rollups.lot_count + EXCLUDED.lot_count,
+                total_amount = investment_rollups.total_amount + EXCLUDED.total_amount,
+                total_return = investment_rollups.total_return + EXCLUDED.total_return
+        """, (source, last_id, pending_id))
+        settled = cursor.rowcount
+        last_id, pending_id, pending_vxids = pending_id, None, None
+
+    # 先读最大 id 再读进行中的事务：持有更小 id 的未提交事务此时一定还在进行中
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source}")
+    max_id = cursor.fetchone()[0]
+    if max_id > last_id:
+        pending_id, pending_vxids = max_id, open_transactions(cursor)
+
+    cursor.execute("""
+        UPDATE rollup_watermarks SET last_id = %s, pending_id = %s, pending_vxids = %s, refreshed_at = now()
+        WHERE source = %s
+    """, (last_id, pending_id, pending_vxids, source))
+    return settled
+
+
+def refresh_rollups():
+    """
+    把各来源表中已确认提交完毕的新行增量聚合进 investment_rollups
+    水位线行被 FOR UPDATE 锁住，多个进程同时刷新时不会重复累加。水位线之后的行在查询时实时聚合（见 query_rollups），
+    所以刚写入、尚未计入预聚合表的记录也会出现在统计结果中。
+    只处理新插入的行；历史记录被修改或删除后需要调用 rebuild_rollups() 重建。
+    """
+    global _dirty, _refreshed_at
+    with _state_lock:
+        _dirty = False
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                for source, select in ROLLUP_SOURCES.items():
+                    _refresh_source(cursor, source, select)
+            conn.commit()
+    except Exception:
+        _mark_dirty()
+        raise
+    with _state_lock:
+        _refreshed_at = time.monotonic()
+
+
+def rebuild_rollups():
+    """清空预聚合表并从头重建"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("LOCK TABLE rollup_watermarks IN EXCLUSIVE MODE")
+            cursor.execute("DELETE FROM investment_rollups")
+            cursor.execute("DELETE FROM rollup_watermarks")
+        conn.commit()
+    refresh_rollups()
+
+
+def ensure_fresh():
+    """来源表有写入或距上次刷新过久时先增量刷新"""
+    with _state_lock:
+        stale = _dirty or time.monotonic() - _refreshed_at > ROLLUP_MAX_AGE
+    if stale:
+        refresh_rollups()
+
+
+# 各来源表中水位线之后（尚未计入预聚合表）的行，按与预聚合表相同的粒度实时聚合
+_RECENT_ROWS_SQL = " UNION ALL ".join(
+    f"""
+    SELECT '{source}' AS source, * FROM ({_aggregate_sql(
+        source, select,
+        f"id > COALESCE((SELECT last_id FROM rollup_watermarks WHERE source = '{source}'), 0)"
+    )}) AS recent_{source}
+    """
+    for source, select in ROLLUP_SOURCES.items()
+)
+
+
+def _month_start(date):
+    return date.replace(day=1) if date else None
+
+
+def query_rollups(user_ids=None, start_date=None, end_date=None, investment_type=None, sub_type=None,
+                  group_by=("user_id",), realized_only=False):
+    """
+    从预聚合表中查询任意区间的统计数据（区间按月对齐：包含 start_date 和 end_date 所在的整月）
+    水位线之后尚未计入预聚合表的行在同一条语句中实时聚合后合并进来
+    :param user_ids: 用户 id 列表，None 表示所有用户
+    :param group_by: 分组列，可选 user_id、investment_type、sub_type、month
+    :param realized_only: 只统计有已实现回报的记录（investments 表），用于 ROI 和净收益
+    :return: 每组一行，包含 lot_count、total_amount、total_return、net_profit、roi
+    """
+    allowed = {"user_id", "investment_type", "sub_type", "month"}
+    if not set(group_by) <= allowed:
+        raise ValueError(f"不支持的分组列: {set(group_by) - allowed}")
+    ensure_fresh()
+
+    conditions = []
+    params = []
+    if user_ids is not None:
+        conditions.append("user_id = ANY(%s)")
+        params.append(list(user_ids))
+    if start_date:
+        conditions.append("month >= %s")
+        params.append(_month_start(start_date))
+    if end_date:
+        conditions.append("month <= %s")
+        params.append(_month_start(end_date))
+    if investment_type:
+        conditions.append("investment_type = %s")
+        params.append(investment_type)
+    if sub_type:
+        conditions.append("sub_type = %s")
+        params.append(sub_type)
+    if realized_only:
+        conditions.append("source = 'investments'")
+
+    columns = ", ".join(group_by)
+    query = f"""
+        SELECT {columns + ',' if columns else ''}
+               SUM(lot_count)::bigint AS lot_count,
+               SUM(total_amount) AS total_amount,
+               SUM(total_return) AS total_return,
+               SUM(total_return) - SUM(total_amount) FILTER (WHERE total_return IS NOT NULL) AS net_profit,
+               (SUM(total_return) - SUM(total_amount) FILTER (WHERE total_return IS NOT NULL)) * 100
+                   / NULLIF(SUM(total_amount) FILTER (WHERE total_return IS NOT NULL), 0) AS roi
+        FROM (
+            SELECT source, user_id, investment_type, sub_type, month, lot_count, total_amount, total_return
+            FROM investment_rollups
+            UNION ALL
+            {_RECENT_ROWS_SQL}
+        ) AS rollups
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        {'GROUP BY ' + columns if columns else ''}
+        {'ORDER BY ' + columns if columns else ''}
+    """
+    return fetch_all(query, tuple(params))
+
+
+def get_user_summary(user_id, start_date=None, end_date=None, investment_type=None):
+    """单个用户在区间内的已实现统计：总投资、总回报、净收益和 ROI"""
+    rows = query_rollups([user_id], start_date, end_date, investment_type, group_by=(), realized_only=True)
+    row = rows[0] if rows else {}
+    return {
+        "total_investment": row.get("total_amount") or 0,
+        "total_return": row.get("total_return") or 0,
+        "net_profit": row.get("net_profit") or 0,
+        "roi": row.get("roi") or 0,
+    }
+
+
+def get_roi(user_id, start_date=None, end_date=None, investment_type=None):
+    """区间 ROI（百分比）"""
+    return get_user_summary(user_id, start_date, end_date, investment_type)["roi"]
+
+
+def get_net_profit(user_id, start_date=None, end_date=None, investment_type=None):
+    """区间净收益"""
+    return get_user_summary(user_id, start_date, end_date, investment_type)["net_profit"]
+
+
+def get_volume(user_id, start_date=None, end_date=None, investment_type=None, by_month=False):
+    """
+    区间交易量（包括虚拟币和股票的买入金额）
+    :param by_month: True 时按月返回 [{"month", "lot_count", "total_amount"}]，否则返回总金额
+    """
+    if by_month:
+        return [
+            {"month": row["month"], "lot_count": row["lot_count"], "total_amount": row["total_amount"]}
+            for row in query_rollups([user_id], start_date, end_date, investment_type, group_by=("month",))
+        ]
+    rows = query_rollups([user_id], start_date, end_date, investment_type, group_by=())
+    return (rows[0]["total_amount"] or 0) if rows else 0
+
+
+if __name__ == "__main__":
+    # 可放在定时任务中运行：python analytics.py
+    refresh_rollups()
+    print("预聚合表已刷新")
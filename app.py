@@ -2,93 +2,59 @@ import streamlit as st
 import datetime
 import pandas as pd
 from decimal import Decimal
-import json
-from auth import login, get_user_by_username
-from database import fetch_all, fetch_one, execute_query
-import ccxt
-import yfinance as yf  # 用于获取股票实时价格
+from auth import AuthBusyError, login, get_session_user
+from database import fetch_all, execute_query, query_cache, query_stats
+from quotes import get_all_quotes, normalize_symbol
 from dotenv import load_dotenv
-import os
-import pymongo
 from admin import admin_dashboard
+from investments import get_user_holdings, value_holdings, list_investments_page
+from teams import search_teams
+from mongo import get_match_history
+from enrichment import enrich_records
+from details import format_details
+from price_history import portfolio_history
+from valuation import decimal_array, decimal_sum
+from tracing import span, trace_page
 
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
-# 获取 MongoDB 配置
-MONGO_HOST = "mongodb://localhost:27017/"  # 默认的 MongoDB 连接字符串
+# 投资类型筛选 -> (需要查询的记录来源, investments 表上的投资类型条件)
+LISTING_FILTERS = {
+    "全部": (["investment", "crypto", "stock"], None),
+    "股票": (["stock"], None),
+    "黄金": (["investment"], "黄金"),
+    "期货": (["investment"], "期货"),
+    "博彩": (["investment"], "博彩"),
+    "虚拟币": (["crypto"], None),
+}
+PAGE_SIZES = [20, 50, 100]
+# 持仓市值走势依赖的表，有写入时会话中保存的走势作废
+PORTFOLIO_HISTORY_TABLES = ("crypto_investments", "stock_investments")
+
+# 获取用户预测项目（只取项目名称）
+def get_user_predictions(user_id):
+    query = "SELECT project FROM user_predictions WHERE user_id = %s ORDER BY created_at, project"
+    return [row["project"] for row in fetch_all(query, (user_id,), cache_tables=("user_predictions",))]
 
-# 连接到 MongoDB 数据库
-def get_mongo_client():
-    return pymongo.MongoClient(MONGO_HOST)
+# 添加预测项目：单行插入，项目已存在时不做改动
+def add_user_prediction(user_id, project):
+    """
+    :return: True 表示新增了项目，False 表示项目已存在
+    """
+    query = """
+        INSERT INTO user_predictions (user_id, project) VALUES (%s, %s)
+        ON CONFLICT (user_id, project) DO NOTHING
+    """
+    return execute_query(query, (user_id, project)) > 0
 
-# 获取用户预测项目
-def get_user_predictions(user_id):
-    query = "SELECT predictions FROM users WHERE id = %s"
-    result = fetch_one(query, (user_id,))
-    if result and result["predictions"]:
-        if isinstance(result["predictions"], str):
-            return json.loads(result["predictions"])
-        elif isinstance(result["predictions"], dict):
-            return result["predictions"]
-    return {}
-
-# 更新用户预测项目
-def update_user_predictions(user_id, predictions):
-    query = "UPDATE users SET predictions = %s WHERE id = %s"
-    execute_query(query, (json.dumps(predictions), user_id))
-
-# 获取 MongoDB 中的赛季历史对阵情况# 从 MongoDB 中检索历史对阵情况
-# 获取 MongoDB 中的赛季历史对阵情况# 从 MongoDB 中检索历史对阵情况
-def get_season_match_history(season, home_team, away_team):
-    client = get_mongo_client()
-    db = client["NHL"]
-    collection = db[season]
-    result = collection.find({
-        "主队": home_team,
-        "客队": away_team
-    })
-    # 在将结果转换为列表之后再关闭客户端
-    match_history = list(result)
-    client.close()
-    return match_history
-
-# 从 PostgreSQL 数据库中检索球队名称# 从 PostgreSQL 数据库中检索球队名称
-def get_team_names():
-    query = "SELECT english_name, chinese_name FROM teams"
-    result = fetch_all(query)
-    english_to_english = {team["english_name"]: team["english_name"] for team in result}
-    chinese_to_english = {team["chinese_name"]: team["english_name"] for team in result}
-
-    # 创建用于模糊匹配的字典
-    fuzzy_dict = {}
-    for eng_name, eng_value in english_to_english.items():
-        for i in range(len(eng_name)):
-            for j in range(i + 1, len(eng_name) + 1):
-                sub_str = eng_name[i:j].lower()  # 英文子串转换为小写
-                fuzzy_dict[sub_str] = eng_value
-
-    for chi_name, eng_value in chinese_to_english.items():
-        for i in range(len(chi_name)):
-            for j in range(i + 1, len(chi_name) + 1):
-                sub_str = chi_name[i:j]
-                fuzzy_dict[sub_str] = eng_value
-
-    return english_to_english, chinese_to_english, fuzzy_dict
 def get_current_price(symbol):
     """
     获取虚拟币的实时价格（以 USDT 为单位）
     :param symbol: 虚拟币符号（如 "BTC", "ETH" 等）
     :return: 当前价格（float）
     """
-    exchange = ccxt.binance()
-    try:
-        symbol_with_quote = f"{symbol.upper()}/USDT"
-        ticker = exchange.fetch_ticker(symbol_with_quote)
-        return ticker["last"]
-    except Exception as e:
-        print(f"无法获取 {symbol} 的实时价格: {e}")
-        return None
+    return get_all_quotes({"crypto": [symbol]}).get("crypto", normalize_symbol(symbol))
 
 def get_stock_current_price(symbol):
     """
@@ -96,13 +62,7 @@ def get_stock_current_price(symbol):
     :param symbol: 股票代码（如 "AAPL", "TSLA" 等）
     :return: 当前价格（float）
     """
-    try:
-        stock = yf.Ticker(symbol)
-        current_price = stock.history(period="1d")["Close"].iloc[-1]  # 获取最近一天的收盘价
-        return float(current_price)
-    except Exception as e:
-        print(f"无法获取 {symbol} 的实时价格: {e}")
-        return None
+    return get_all_quotes({"stock": [symbol]}).get("stock", normalize_symbol(symbol))
 
 def calculate_project_balances(user_id):
     """
@@ -127,75 +87,20 @@ def calculate_project_balances(user_id):
     if betting_balance and betting_balance[0]["net_profit"]:
         project_balances["博彩余额"] += Decimal(str(betting_balance[0]["net_profit"]))
 
-    # 计算虚拟币余额（当前总价值）
-    query_crypto = """
-        SELECT sub_type, buy_price, quantity
-        FROM crypto_investments
-        WHERE user_id = %s
-    """
-    crypto_investments = fetch_all(query_crypto, (user_id,))
-    for record in crypto_investments:
-        current_price = get_current_price(record["sub_type"])
-        if current_price is not None:
-            project_balances["虚拟币余额"] += Decimal(str(current_price)) * Decimal(str(record["quantity"]))
-
-    # 计算股票余额（当前总价值）
-    query_stock = """
-        SELECT sub_type, buy_price, quantity
-        FROM stock_investments
-        WHERE user_id = %s
-    """
-    stock_investments = fetch_all(query_stock, (user_id,))
-    for record in stock_investments:
-        current_price = get_stock_current_price(record["sub_type"])
-        if current_price is not None:
-            project_balances["股票余额"] += Decimal(str(current_price)) * Decimal(str(record["quantity"]))
+    # 计算虚拟币余额和股票余额（当前总价值）：先在 SQL 中按代码汇总，再按代码取价
+    balance_keys = {"crypto": "虚拟币余额", "stock": "股票余额"}
+    holdings = value_holdings(get_user_holdings(user_id))
+    current_values = decimal_array([holding["current_value"] for holding in holdings])
+    for asset_class, balance_key in balance_keys.items():
+        mask = [holding["asset_class"] == asset_class for holding in holdings]
+        project_balances[balance_key] += decimal_sum(current_values, mask)
 
     return project_balances
 
-def format_details(details):
-    """将 details 字段转换为更易读的文本格式"""
-    try:
-        if isinstance(details, str):
-            try:
-                details = json.loads(details)
-            except json.JSONDecodeError:
-                return details
-
-        readable_text = []
-        if "team_a" in details and "team_b" in details:
-            team_a_str = (
-                f"{details['team_a']['english_name']} ({details['team_a']['chinese_name']})"
-                if isinstance(details["team_a"], dict) else details["team_a"]
-            )
-            team_b_str = (
-                f"{details['team_b']['english_name']} ({details['team_b']['chinese_name']})"
-                if isinstance(details["team_b"], dict) else details["team_b"]
-            )
-            readable_text.append(f"{team_a_str} vs {team_b_str}")
-
-        if "game" in details:
-            readable_text.append(f"赛制: {details['game']}")
-
-        if "amount" in details:
-            readable_text.append(f"押注金额: ${details['amount']:.2f}")
-
-        if "return_amount" in details:
-            readable_text.append(f"回报金额: ${details['return_amount']:.2f}")
-
-        if "bet_options" in details:
-            bet_options = ", ".join(
-                f"{opt['type']} (赔率: {opt['odds']}, {'已选' if opt['selected'] else '未选'})"
-                for opt in details["bet_options"]
-            )
-            readable_text.append(f"赔率选项: {bet_options}")
-
-        return " | ".join(readable_text) if readable_text else "无详情信息"
-    except Exception as e:
-        print(f"解析 details 字段失败: {e}")
-        return "无法解析详情字段"
-
+@trace_page("app")
 def main():
+    # 统计本次页面运行执行的语句数（管理员面板中展示）
+    query_stats.begin_rerun()
     st.title("Habitats Investment Tracking")
 
     # 初始化会话状态
@@ -214,10 +119,16 @@ def main():
         username = st.text_input("用户名")
         password = st.text_input("密码", type="password")
         if st.button("登录"):
-            user = login(username, password)
+            try:
+                with span("login"):
+                    user = login(username, password)
+            except AuthBusyError as e:
+                st.warning(str(e))
+                return
             if user:
                 # 动态计算各项目余额
-                project_balances = calculate_project_balances(user["id"])
+                with span("calculate_project_balances"):
+                    project_balances = calculate_project_balances(user["id"])
 
                 st.session_state["logged_in"] = True
                 st.session_state["username"] = user["username"]
@@ -228,7 +139,8 @@ def main():
                 st.error("用户名或密码错误")
     else:
         # 获取用户信息
-        user = get_user_by_username(st.session_state["username"])
+        with span("get_session_user"):
+            user = get_session_user(st.session_state, st.session_state["username"])
         if not user:
             st.error("用户信息加载失败，请重新登录。")
             st.session_state["logged_in"] = False
@@ -246,6 +158,30 @@ def main():
             st.write(f"- 虚拟币余额: ${project_balances['虚拟币余额']:.2f}")
             st.write(f"- 股票余额: ${project_balances['股票余额']:.2f}")
 
+            # 持仓市值走势（读取本地历史收盘价，由 price_refresher.py 定时补齐）
+            # 折叠的 expander 每次重新运行也会执行，只在点击按钮后计算；
+            # 结果按 (用户, 日期) 保存在会话中，持仓表有写入时作废
+            with st.expander("持仓市值走势（过去一年）"):
+                today = datetime.date.today()
+                history_key = (user["id"], today, query_cache.versions(PORTFOLIO_HISTORY_TABLES))
+                loaded = st.session_state.get("portfolio_history")
+                if loaded is not None and loaded["key"] != history_key:
+                    loaded = st.session_state["portfolio_history"] = None
+                if st.button("刷新走势" if loaded else "加载走势", key="load_portfolio_history"):
+                    with span("portfolio_history"):
+                        loaded = st.session_state["portfolio_history"] = {
+                            "key": history_key,
+                            "frame": portfolio_history([user["id"]], today - datetime.timedelta(days=365), today),
+                        }
+                if loaded is None:
+                    st.caption("点击按钮加载持仓市值走势。")
+                elif loaded["frame"].empty:
+                    st.info("暂无持仓或历史价格数据。")
+                else:
+                    st.line_chart(
+                        loaded["frame"].set_index("date")[["value", "cost"]].rename(columns={"value": "市值", "cost": "成本"})
+                    )
+
             # 查询模块
             st.subheader("我的投资记录")
 
@@ -279,98 +215,78 @@ def main():
             else:
                 start_date, end_date = one_month_ago, today
 
-            # 根据筛选条件查询投资记录
-            if st.session_state["selected_investment_type"]:
-                filtered_investments = []
-
-                if st.session_state["selected_investment_type"] in ["全部", "博彩"]:
-                    query = """
-                        SELECT id, user_id, investment_type, sub_type, amount, return_amount, investment_date, details
-                        FROM investments
-                        WHERE user_id = %s AND investment_date BETWEEN %s AND %s
-                    """
-                    if st.session_state["selected_investment_type"] != "全部":
-                        query += " AND investment_type = %s"
-                        filtered_investments += fetch_all(query, (
-                            user["id"], start_date, end_date, st.session_state["selected_investment_type"]
-                        ))
-                    else:
-                        filtered_investments += fetch_all(query, (user["id"], start_date, end_date))
-
-                if st.session_state["selected_investment_type"] in ["全部", "虚拟币"]:
-                    query = """
-                        SELECT id, user_id, sub_type, buy_price, quantity, investment_date
-                        FROM crypto_investments
-                        WHERE user_id = %s AND investment_date BETWEEN %s AND %s
-                    """
-                    filtered_investments += fetch_all(query, (user["id"], start_date, end_date))
-
-                    # 添加虚拟币的当前价格和总价值
-                    for record in filtered_investments:
-                        if "buy_price" in record and "quantity" in record:
-                            current_price = get_current_price(record["sub_type"])
-                            if current_price is not None:
-                                record["current_price"] = current_price
-                                record["current_value"] = Decimal(str(current_price)) * Decimal(str(record["quantity"]))
-                            else:
-                                record["current_price"] = None
-                                record["current_value"] = None
-
-                if st.session_state["selected_investment_type"] in ["全部", "股票"]:
-                    query = """
-                        SELECT id, user_id, sub_type, buy_price, quantity, investment_date
-                        FROM stock_investments
-                        WHERE user_id = %s AND investment_date BETWEEN %s AND %s
-                    """
-                    filtered_investments += fetch_all(query, (user["id"], start_date, end_date))
-
-                    # 添加股票的当前价格和总价值
-                    for record in filtered_investments:
-                        if "buy_price" in record and "quantity" in record:
-                            current_price = get_stock_current_price(record["sub_type"])
-                            if current_price is not None:
-                                record["current_price"] = current_price
-                                record["current_value"] = Decimal(str(current_price)) * Decimal(str(record["quantity"]))
-                            else:
-                                record["current_price"] = None
-                                record["current_value"] = None
+            # 根据筛选条件分页查询投资记录（服务端 keyset 分页，每次只读取一页）
+            selected_type = st.session_state["selected_investment_type"]
+            if selected_type:
+                asset_classes, type_filter = LISTING_FILTERS[selected_type]
+                page_size = st.selectbox("每页条数", PAGE_SIZES, key="page_size")
+                team_filter = game_filter = None
+                if "investment" in asset_classes and type_filter in (None, "博彩"):
+                    filter_cols = st.columns(2)
+                    team_filter = filter_cols[0].text_input("球队（英文名）", key="listing_team").strip() or None
+                    game_filter = filter_cols[1].text_input("赛制", key="listing_game").strip() or None
+
+                # 筛选条件变化时回到第一页
+                listing_filters = (selected_type, start_date, end_date, page_size, team_filter, game_filter)
+                if st.session_state.get("listing_filters") != listing_filters:
+                    st.session_state["listing_filters"] = listing_filters
+                    st.session_state["listing_cursor"] = None
+                    st.session_state["listing_direction"] = "next"
+
+                with span("list_investments_page", page_size=page_size):
+                    page = list_investments_page(
+                        user["id"], asset_classes, start_date, end_date,
+                        investment_type=type_filter,
+                        cursor=st.session_state["listing_cursor"],
+                        direction=st.session_state["listing_direction"],
+                        page_size=page_size,
+                        team=team_filter,
+                        game=game_filter
+                    )
+                # 每条记录按查询给出的资产类别路由到对应报价服务，只取价一次
+                with span("enrich_records", rows=len(page["rows"])):
+                    page_investments = enrich_records(page["rows"])
 
                 # 显示投资记录
-                if filtered_investments:
+                if page_investments:
                     # 将投资记录转换为 Pandas DataFrame
                     filtered_investments_mapped = []
-                    for inv in filtered_investments:
-                        if "details" in inv:  # 博彩记录
-                            readable_details = format_details(inv["details"])
+                    for inv in page_investments:
+                        if not inv.is_priced:  # 博彩等记录
+                            # 优先使用写入时生成的摘要，尚未回填的旧记录才解析 JSON
+                            readable_details = inv.details_summary or format_details(inv.details)
                             filtered_investments_mapped.append({
-                                "类型": inv["investment_type"],
-                                "子类型": inv["sub_type"],
-                                "金额": inv["amount"],
-                                "回报": inv["return_amount"],
-                                "日期": inv["investment_date"],
+                                "类型": inv.investment_type,
+                                "子类型": inv.sub_type,
+                                "金额": inv.amount,
+                                "回报": inv.return_amount,
+                                "日期": inv.investment_date,
                                 "详情": readable_details
                             })
-                        elif "buy_price" in inv and "quantity" in inv:  # 虚拟币或股票记录
-                            inv_type = "虚拟币" if st.session_state["selected_investment_type"] in ["全部", "虚拟币"] else "股票"
-
+                        else:  # 虚拟币或股票记录
                             readable_details = [
-                                f"类型: {inv['sub_type']}",
-                                f"买入价格: ${inv['buy_price']:.2f}" if inv['buy_price'] is not None else "买入价格: N/A",
-                                f"购买数量: {inv['quantity']:.4f}" if inv['quantity'] is not None else "购买数量: N/A",
-                                f"当前价格: ${inv['current_price']:.2f}" if inv['current_price'] is not None else "无法获取当前价格",
-                                f"当前总价值: ${inv['current_value']:.2f}" if inv['current_value'] is not None else "无法计算当前价值"
+                                f"类型: {inv.sub_type}",
+                                f"买入价格: ${inv.buy_price:.2f}" if inv.buy_price is not None else "买入价格: N/A",
+                                f"购买数量: {inv.quantity:.4f}" if inv.quantity is not None else "购买数量: N/A",
+                                f"当前价格: ${inv.current_price:.2f}" if inv.current_price is not None else "无法获取当前价格",
+                                f"当前总价值: ${inv.current_value:.2f}" if inv.current_value is not None else "无法计算当前价值"
                             ]
                             filtered_investments_mapped.append({
-                                "类型": inv_type,
-                                "子类型": inv["sub_type"],
-                                "金额": Decimal(str(inv["buy_price"])) * Decimal(str(inv["quantity"])) if inv["buy_price"] and inv["quantity"] else Decimal("0.0"),
-                                "回报": inv["current_value"] if inv["current_value"] else None,
-                                "日期": inv["investment_date"],
+                                "类型": inv.investment_type,
+                                "子类型": inv.sub_type,
+                                "金额": inv.cost if inv.cost else Decimal("0.0"),
+                                "回报": inv.current_value if inv.current_value else None,
+                                "日期": inv.investment_date,
                                 "详情": " | ".join(readable_details)
                             })
 
                     df = pd.DataFrame(filtered_investments_mapped)
 
+                    # 超时或失败的代码不阻塞页面，只给出提示
+                    missing_symbols = sorted({inv.symbol for inv in page_investments if inv.price_missing})
+                    if missing_symbols:
+                        st.caption(f"以下代码的价格暂时无法获取: {', '.join(missing_symbols)}")
+
                     # 美化表格
                     st.dataframe(df.style.format({
                         "金额": lambda x: "${:.2f}".format(x) if x is not None else "N/A",
@@ -379,34 +295,46 @@ def main():
                 else:
                     st.info("未找到符合条件的投资记录。")
 
+                # 翻页
+                prev_col, next_col = st.columns(2)
+                if page["prev_cursor"] is not None and prev_col.button("上一页", key="listing_prev"):
+                    st.session_state["listing_cursor"] = page["prev_cursor"]
+                    st.session_state["listing_direction"] = "prev"
+                    st.rerun()
+                if page["next_cursor"] is not None and next_col.button("下一页", key="listing_next"):
+                    st.session_state["listing_cursor"] = page["next_cursor"]
+                    st.session_state["listing_direction"] = "next"
+                    st.rerun()
+
             # 博彩预测功能
             st.subheader("博彩预测")
 
             # 获取用户预测项目
-            user_predictions = get_user_predictions(user["id"])
+            with span("get_user_predictions"):
+                user_predictions = get_user_predictions(user["id"])
 
             # 添加新的预测项目
             new_prediction = st.text_input("添加新的预测项目（如 NBA, NHL 等）")
             if st.button("添加项目"):
                 if new_prediction:
-                    user_predictions[new_prediction] = {}
-                    update_user_predictions(user["id"], user_predictions)
-                    st.success(f"已添加新的预测项目: {new_prediction}")
+                    if add_user_prediction(user["id"], new_prediction):
+                        user_predictions.append(new_prediction)
+                        st.success(f"已添加新的预测项目: {new_prediction}")
+                    else:
+                        st.info(f"预测项目已存在: {new_prediction}")
                 else:
                     st.error("请输入有效的项目名称。")
 
             # 选择已添加的预测项目
-            selected_sport = st.selectbox("选择预测项目", list(user_predictions.keys()))
+            selected_sport = st.selectbox("选择预测项目", user_predictions)
 
             # 输入主场球队和客场球队
             home_team_input = st.text_input("输入主场球队名称（英文或中文）").strip().lower()
             away_team_input = st.text_input("输入客场球队名称（英文或中文）").strip().lower()
 
-            # 从 PostgreSQL 数据库中检索球队名称
-            english_to_english, chinese_to_english, fuzzy_dict = get_team_names()
-
-            # 查找主场球队的所有匹配结果
-            home_matching_teams = [value for key, value in fuzzy_dict.items() if home_team_input in key]
+            # 查找主场球队的所有匹配结果（索引在进程内共享，只在 teams 表变化时重建）
+            with span("search_teams"):
+                home_matching_teams = [team["english_name"] for team in search_teams(home_team_input)]
             if home_matching_teams:
                 selected_home_team = st.selectbox(f"找到 {len(home_matching_teams)} 个主场球队匹配结果，请选择:", home_matching_teams)
             else:
@@ -414,27 +342,31 @@ def main():
                 selected_home_team = None
 
             # 查找客场球队的所有匹配结果
-            away_matching_teams = [value for key, value in fuzzy_dict.items() if away_team_input in key]
+            with span("search_teams"):
+                away_matching_teams = [team["english_name"] for team in search_teams(away_team_input)]
             if away_matching_teams:
                 selected_away_team = st.selectbox(f"找到 {len(away_matching_teams)} 个客场球队匹配结果，请选择:", away_matching_teams)
             else:
                 st.error(f"未找到客场球队: {away_team_input}")
                 selected_away_team = None
 
-            # 选择赛季
+            # 选择赛季（可多选，一次查询返回所有赛季的结果）
             seasons = ["2019-2020", "2020-2021", "2021-2022", "2022-2023", "2023-2024", "2024-2025"]
-            selected_season = st.selectbox("选择赛季", seasons)
+            selected_seasons = st.multiselect("选择赛季", seasons, default=seasons[-1:])
 
             # 检索历史对阵情况
             if st.button("检索历史对阵情况"):
-                if selected_home_team and selected_away_team:
-                    match_history = get_season_match_history(selected_season, selected_home_team, selected_away_team)
+                if selected_home_team and selected_away_team and selected_seasons:
+                    with span("get_match_history", seasons=len(selected_seasons)):
+                        match_history = get_match_history(selected_seasons, selected_home_team, selected_away_team)
                     if match_history:
                         st.write("历史对阵情况:")
                         for match in match_history:
-                            st.write(f"日期: {match.get('日期', '无')}, 时间: {match.get('时间', '无')}, 主队: {match.get('主队', '无')}, 主队进球数: {match.get('主队进球数', '无')}, 客队: {match.get('客队', '无')}, 客队进球数: {match.get('客队进球数', '无')}, 观众数量: {match.get('观众数量', '无')}, LOG: {match.get('LOG', '无')}, 备注: {match.get('备注', '无')}")
+                            st.write(f"赛季: {match.get('赛季', '无')}, 日期: {match.get('日期', '无')}, 时间: {match.get('时间', '无')}, 主队: {match.get('主队', '无')}, 主队进球数: {match.get('主队进球数', '无')}, 客队: {match.get('客队', '无')}, 客队进球数: {match.get('客队进球数', '无')}, 观众数量: {match.get('观众数量', '无')}, LOG: {match.get('LOG', '无')}, 备注: {match.get('备注', '无')}")
                     else:
                         st.info("未找到历史对阵情况。")
+                elif not selected_seasons:
+                    st.error("请至少选择一个赛季。")
                 else:
                     st.error("请正确选择主场球队和客场球队名称。")
         elif user["role"] == "admin":
@@ -1,6 +1,21 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import bcrypt
 from database import fetch_one
 
+# 密码校验线程池配置：bcrypt 是 CPU 密集型操作，限制并发避免登录高峰占满所有核心
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))  # 排队 + 执行中的校验请求上限，超出直接拒绝
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))  # 单次登录等待校验结果的最长秒数
+
+SESSION_USER_KEY = "_user_snapshot"  # 会话中缓存的用户快照
+
+
+class AuthBusyError(Exception):
+    """登录请求过多，密码校验队列已满或等待超时"""
+
 def hash_password(password):
     """加密密码"""
     salt = bcrypt.gensalt()
@@ -17,6 +32,94 @@ def verify_password(stored_password, provided_password):
         print(f"密码验证失败: {e}")
         return False
 
+class PasswordVerifier:
+    """
+    在有界线程池中执行 bcrypt 校验
+    同时排队和执行的请求数不超过 max_pending，超出或等待超时时抛出 AuthBusyError，
+    登录高峰只会让部分登录请求失败重试，不会拖慢其他会话的页面刷新。
+    """
+
+    def __init__(self, workers=AUTH_WORKERS, max_pending=AUTH_MAX_PENDING, timeout=AUTH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+            "verify_time_total": 0.0,
+        }
+
+    def _run(self, enqueued_at, stored_password, provided_password):
+        started_at = time.monotonic()
+        try:
+            return verify_password(stored_password, provided_password)
+        finally:
+            finished_at = time.monotonic()
+            wait = started_at - enqueued_at
+            with self._lock:
+                self._stats["completed"] += 1
+                self._stats["queue_wait_total"] += wait
+                self._stats["queue_wait_max"] = max(self._stats["queue_wait_max"], wait)
+                self._stats["verify_time_total"] += finished_at - started_at
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def verify(self, stored_password, provided_password):
+        """校验密码，返回 True/False；队列已满或超时时抛出 AuthBusyError"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise AuthBusyError("登录请求过多，请稍后再试")
+        with self._lock:
+            self._pending += 1
+            self._stats["submitted"] += 1
+        # 名额在任务真正结束时才归还，超时放弃等待的任务仍然占用名额
+        future = self._executor.submit(self._run, time.monotonic(), stored_password, provided_password)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise AuthBusyError("登录验证超时，请稍后再试")
+
+    def stats(self):
+        """线程池运行状态，供管理员面板展示"""
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+        completed = stats["completed"]
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "submitted": stats["submitted"],
+            "completed": completed,
+            "rejected": stats["rejected"],
+            "timeouts": stats["timeouts"],
+            "avg_queue_wait_ms": round(stats["queue_wait_total"] / completed * 1000, 3) if completed else 0.0,
+            "max_queue_wait_ms": round(stats["queue_wait_max"] * 1000, 3),
+            "avg_verify_ms": round(stats["verify_time_total"] / completed * 1000, 3) if completed else 0.0,
+        }
+
+
+password_verifier = PasswordVerifier()
+
+
+def get_auth_stats():
+    return password_verifier.stats()
+
 def login(username, password):
     """用户登录验证"""
     query = """
@@ -25,7 +128,7 @@ def login(username, password):
         WHERE username = %s
     """
     user = fetch_one(query, (username,))
-    if user and verify_password(user["password_hash"], password):
+    if user and password_verifier.verify(user["password_hash"], password):
         return {
             "id": user["id"],
             "username": user["username"],
@@ -42,7 +145,7 @@ def get_user_by_username(username):
         FROM users
         WHERE username = %s
     """
-    user = fetch_one(query, (username,))
+    user = fetch_one(query, (username,), cache_tables=("users",))
     if user:
         return {
             "id": user["id"],
@@ -51,4 +154,40 @@ def get_user_by_username(username):
             "role": user["role"],
             "balance": user["balance"]
         }
-    return None
\ No newline at end of file
+    return None
+
+def get_session_user(session, username):
+    """
+    获取当前会话的登录用户
+    会话中保存一份用户快照和行版本号（PostgreSQL 的 xmin，行每次被更新都会变化）；
+    每次页面刷新只查询版本号，版本未变时直接使用快照，变化后才重新读取整行。
+    :param session: 会话状态（st.session_state）
+    :return: 用户字典，用户不存在时返回 None
+    """
+    snapshot = session.get(SESSION_USER_KEY)
+    if snapshot and snapshot["user"]["username"] == username:
+        row = fetch_one("SELECT xmin::text AS version FROM users WHERE id = %s", (snapshot["user"]["id"],))
+        if row and row["version"] == snapshot["version"]:
+            return snapshot["user"]
+
+    query = """
+        SELECT id, username, password_hash, role, balance, xmin::text AS version
+        FROM users
+        WHERE username = %s
+    """
+    user = fetch_one(query, (username,))
+    if not user:
+        session.pop(SESSION_USER_KEY, None)
+        return None
+    snapshot = {
+        "version": user["version"],
+        "user": {
+            "id": user["id"],
+            "username": user["username"],
+            "password_hash": user["password_hash"],
+            "role": user["role"],
+            "balance": user["balance"]
+        }
+    }
+    session[SESSION_USER_KEY] = snapshot
+    return snapshot["user"]
@@ -0,0 +1,280 @@
+"""
+离线基准测试：在本地 PostgreSQL、mongomock 和假行情数据源上对页面的热点路径计时
+
+用法:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/trackers_bench \
+        python benchmarks/run_benchmarks.py --users 20 --lots 500 --output bench.json
+
+BENCH_DATABASE_URL 必须指向专门用于基准测试的库：脚本会建表、执行迁移，
+并删除后重新写入用户名以 bench_user_ 开头的合成数据。不会访问交易所、雅虎财经或真实的 MongoDB。
+结果以 JSON 写出（每项的最小值、中位数、平均值、p95，单位毫秒），便于在版本之间比较。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_USER_PREFIX = "bench_user_"
+SEASONS = ["2019-2020", "2020-2021", "2021-2022", "2022-2023", "2023-2024", "2024-2025"]
+CRYPTO_SYMBOLS = ["BTC", "ETH", "SOL", "BNB", "XRP", "DOGE", "ADA", "AVAX"]
+STOCK_SYMBOLS = ["AAPL", "TSLA", "MSFT", "NVDA", "AMZN", "GOOG", "META", "NFLX"]
+INVESTMENT_TYPES = ["博彩", "黄金", "期货"]
+
+# 与线上一致的基础表结构（表已存在时不做改动）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY, username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user', balance NUMERIC(18,2) DEFAULT 0, predictions JSONB
+);
+CREATE TABLE IF NOT EXISTS investments (
+    id SERIAL PRIMARY KEY, user_id INT REFERENCES users(id), investment_type TEXT, sub_type TEXT,
+    amount NUMERIC(18,2), return_amount NUMERIC(18,2), investment_date DATE, details JSONB
+);
+CREATE TABLE IF NOT EXISTS crypto_investments (
+    id SERIAL PRIMARY KEY, user_id INT REFERENCES users(id), sub_type TEXT,
+    buy_price NUMERIC(20,8), quantity NUMERIC(20,8), investment_date DATE
+);
+CREATE TABLE IF NOT EXISTS stock_investments (
+    id SERIAL PRIMARY KEY, user_id INT REFERENCES users(id), sub_type TEXT,
+    buy_price NUMERIC(20,4), quantity NUMERIC(20,4), investment_date DATE
+);
+CREATE TABLE IF NOT EXISTS teams (id SERIAL PRIMARY KEY, english_name TEXT NOT NULL, chinese_name TEXT);
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="基准测试专用库（默认取 BENCH_DATABASE_URL）")
+    parser.add_argument("--users", type=int, default=10, help="合成用户数")
+    parser.add_argument("--lots", type=int, default=200, help="每个用户每张投资表的记录数")
+    parser.add_argument("--teams", type=int, default=500, help="合成球队数")
+    parser.add_argument("--matches", type=int, default=2000, help="每个赛季的合成比赛数")
+    parser.add_argument("--repeat", type=int, default=20, help="每项计时的重复次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("请通过 --database-url 或 BENCH_DATABASE_URL 指定基准测试专用库")
+    return args
+
+
+def random_details(rng, teams):
+    team_a, team_b = rng.sample(teams, 2)
+    amount = round(rng.uniform(10, 1000), 2)
+    return {
+        "team_a": team_a,
+        "team_b": team_b,
+        "game": rng.choice(["常规赛", "季后赛"]),
+        "amount": amount,
+        "return_amount": round(amount * rng.uniform(0, 3), 2),
+        "bet_options": [
+            {"type": option, "odds": round(rng.uniform(1.1, 4.0), 2), "selected": i == 0}
+            for i, option in enumerate(rng.sample(["主胜", "客胜", "大分", "小分"], 2))
+        ],
+    }
+
+
+def seed_database(args, rng):
+    """写入合成的球队、用户和投资记录，返回 (用户 id 列表, 球队列表)"""
+    from psycopg2.extras import execute_values
+    from auth import hash_password
+    from database import get_connection, invalidate_tables
+    from details import backfill_summaries
+    from migrate import apply_migrations
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA)
+        conn.commit()
+    apply_migrations()
+
+    start = datetime.date.today() - datetime.timedelta(days=730)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE username LIKE %s", (BENCH_USER_PREFIX + "%",))
+            old_ids = [row[0] for row in cursor.fetchall()]
+            if old_ids:
+                for table in ("investments", "crypto_investments", "stock_investments"):
+                    cursor.execute(f"DELETE FROM {table} WHERE user_id = ANY(%s)", (old_ids,))
+                cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (old_ids,))
+            cursor.execute("DELETE FROM teams WHERE english_name LIKE 'Bench Team %%'")
+            execute_values(cursor, "INSERT INTO teams (english_name, chinese_name) VALUES %s", [
+                (f"Bench Team {i:04d}", f"测试球队{i:04d}") for i in range(args.teams)
+            ])
+            teams = [
+                {"english_name": f"Bench Team {i:04d}", "chinese_name": f"测试球队{i:04d}"}
+                for i in range(args.teams)
+            ]
+
+            password_hash = hash_password("bench")
+            user_ids = []
+            for n in range(args.users):
+                cursor.execute(
+                    "INSERT INTO users (username, password_hash, role) VALUES (%s, %s, 'user') RETURNING id",
+                    (f"{BENCH_USER_PREFIX}{n:04d}", password_hash)
+                )
+                user_ids.append(cursor.fetchone()[0])
+
+            for user_id in user_ids:
+                def day():
+                    return start + datetime.timedelta(days=rng.randrange(730))
+
+                investments = []
+                for _ in range(args.lots):
+                    details = random_details(rng, teams)
+                    investments.append((
+                        user_id, rng.choice(INVESTMENT_TYPES), rng.choice(["NHL", "NBA", "足球"]),
+                        details["amount"], details["return_amount"], day(), json.dumps(details, ensure_ascii=False)
+                    ))
+                execute_values(cursor, """
+                    INSERT INTO investments (user_id, investment_type, sub_type, amount, return_amount, investment_date, details)
+                    VALUES %s
+                """, investments)
+                for table, symbols in (("crypto_investments", CRYPTO_SYMBOLS), ("stock_investments", STOCK_SYMBOLS)):
+                    execute_values(cursor, f"""
+                        INSERT INTO {table} (user_id, sub_type, buy_price, quantity, investment_date) VALUES %s
+                    """, [
+                        (user_id, rng.choice(symbols), round(rng.uniform(1, 500), 4), round(rng.uniform(0.01, 10), 4), day())
+                        for _ in range(args.lots)
+                    ])
+        conn.commit()
+    backfill_summaries()
+    invalidate_tables(["users", "teams", "investments", "crypto_investments", "stock_investments"])
+    return user_ids, teams
+
+
+def seed_mongo(args, rng, teams):
+    import mongomock
+    from mongo import get_match_db, set_mongo_client
+
+    set_mongo_client(mongomock.MongoClient())
+    db = get_match_db()
+    names = [team["english_name"] for team in teams[:30]]
+    for season in SEASONS:
+        db[season].insert_many([
+            {
+                "日期": f"{season[:4]}-{rng.randint(10, 12)}-{rng.randint(1, 28):02d}",
+                "时间": "19:00",
+                "主队": home,
+                "主队进球数": rng.randint(0, 7),
+                "客队": away,
+                "客队进球数": rng.randint(0, 7),
+                "观众数量": rng.randint(5000, 20000),
+                "LOG": "",
+                "备注": "",
+            }
+            for home, away in (rng.sample(names, 2) for _ in range(args.matches))
+        ])
+    return names
+
+
+def install_fake_providers():
+    import quotes
+
+    prices = {symbol: float(100 + i) for i, symbol in enumerate(CRYPTO_SYMBOLS + STOCK_SYMBOLS)}
+    quotes.crypto_quotes.set_provider(quotes.FakeExchangeProvider(prices))
+    quotes.stock_quotes.set_provider(quotes.FakeExchangeProvider(prices))
+    quotes.PRICE_SOURCE = "live"  # 不读 latest_prices，计时包含取价路径
+
+
+def measure(func, repeat, setup=None):
+    """重复执行 func，返回耗时统计（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+    }
+
+
+def run(args):
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, ROOT)
+    rng = random.Random(args.seed)
+
+    user_ids, teams = seed_database(args, rng)
+    team_names = seed_mongo(args, rng, teams)
+    install_fake_providers()
+
+    import quotes
+    from app import calculate_project_balances
+    from details import format_details
+    from database import fetch_all, query_cache
+    from investments import filter_investments, list_investments_page
+    from mongo import get_season_match_history
+    from teams import search_teams, search_teams_db
+
+    def cold():
+        # 冷启动：清空查询缓存和报价缓存
+        query_cache.clear()
+        quotes.crypto_quotes.clear()
+        quotes.stock_quotes.clear()
+
+    user_id = user_ids[0]
+    details = [row["details"] for row in fetch_all(
+        "SELECT details FROM investments WHERE user_id = %s", (user_id,)
+    )]
+    home, away = team_names[0], team_names[1]
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=180)
+
+    cases = {
+        "calculate_project_balances.cold": (lambda: calculate_project_balances(user_id), cold),
+        "calculate_project_balances.warm": (lambda: calculate_project_balances(user_id), None),
+        "filter_investments.all": (lambda: filter_investments(user_id), cold),
+        "filter_investments.type_and_dates": (lambda: filter_investments(user_id, "博彩", start, end), cold),
+        "list_investments_page.betting": (
+            lambda: list_investments_page(user_id, ["investment"], start, end, "博彩", page_size=100), None
+        ),
+        "search_teams.english": (lambda: search_teams("team 01", limit=20), None),
+        "search_teams.chinese": (lambda: search_teams("球队00", limit=20), None),
+        "search_teams_db.english": (lambda: search_teams_db("team 01", limit=20), cold),
+        "format_details.page": (lambda: [format_details(d) for d in details], None),
+        "get_season_match_history": (lambda: get_season_match_history(SEASONS[-1], home, away), None),
+    }
+
+    results = {}
+    for name, (func, setup) in cases.items():
+        func()  # 预热（建索引、加载市场等一次性开销不计入）
+        results[name] = measure(func, args.repeat, setup)
+        print(f"{name}: 中位数 {results[name]['median_ms']} ms")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run(args)
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
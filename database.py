@@ -1,45 +1,682 @@
+import bisect
+import functools
 import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
+# 连接池配置（均可在 .env 中覆盖）
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))  # 启动时预先建立并常驻的连接数
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))  # 同时存在的最大连接数
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 等待空闲连接的最长秒数
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "30"))  # 空闲超过该秒数的连接在借出前先 ping 一次
+
+# 查询结果缓存配置
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "256"))  # 最多缓存的查询结果条数，0 表示关闭缓存
+# 缓存记录的最长存活秒数：其他进程（导入脚本、price_refresher、其他应用实例）的写入不会淘汰本进程的缓存，
+# 最多在该秒数后读到新数据
+DB_CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "60"))
+
+# 查询统计配置
+DB_INSTRUMENTATION = os.getenv("DB_INSTRUMENTATION", "0") == "1"  # 是否记录每条语句的耗时（可在管理员面板中临时开关）
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # 执行时间超过该毫秒数的语句记入慢查询日志
+DB_SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG")  # 慢查询日志文件；未设置时打印到标准输出
+
+# 从写语句中识别被修改的表名
+_WRITE_TABLE_RE = re.compile(
+    r"\b(?:INSERT\s+INTO|(?<!DO\s)UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|COPY)\s+(?:ONLY\s+)?([\w.\"]+)",
+    re.IGNORECASE
+)
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内没有可用的数据库连接"""
+
+
 def get_db_connection():
     """获取数据库连接"""
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise ValueError("环境变量中未找到 DATABASE_URL，请检查 .env 文件。")
-    
+
     try:
         return psycopg2.connect(database_url)
     except Exception as e:
         print(f"数据库连接失败: {e}")
         raise
 
-def fetch_one(query, params=None):
-    """执行查询并返回单条记录（字典形式）"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-        cursor.execute(query, params)
-        result = cursor.fetchone()
-    conn.close()
+
+class ConnectionPool:
+    """
+    线程安全的 PostgreSQL 连接池
+    Streamlit 的每次脚本运行都在独立线程中执行，所有线程共享同一个连接池。
+    连接用尽时调用方会阻塞等待，直到有连接归还或超时。
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 healthcheck_interval=DB_POOL_HEALTHCHECK_INTERVAL, connect=get_db_connection):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError(f"连接池大小配置无效: min={minconn}, max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle = []  # [(conn, 上次归还时间)]，后进先出，让热连接优先被复用
+        self._size = 0  # 当前已建立（空闲 + 借出）的连接数
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "health_check_failures": 0,
+        }
+        for _ in range(minconn):
+            with self._cond:
+                self._size += 1
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        """借出前的健康检查：已关闭的连接直接丢弃，空闲过久的连接先 ping 一次"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """借出一个可用连接，连接池已满时最多等待 timeout 秒"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            with self._cond:
+                waited = False
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(f"等待数据库连接超时（{self.timeout} 秒），连接池已满: {self.maxconn}")
+                    if not waited:
+                        self._stats["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    conn, last_used = None, None
+                    self._size += 1
+
+            if conn is None:
+                conn = self._new_connection()
+            elif not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += time.monotonic() - start
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """归还连接；未结束的事务会被回滚，损坏的连接会被关闭"""
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_discarded"] += 1
+            self._cond.notify()
+
+    def closeall(self):
+        """关闭所有空闲连接（借出中的连接会在归还时关闭）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """返回连接池运行状态，供管理员面板展示"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            size = self._size
+        checkouts = stats.pop("checkouts")
+        wait_time_total = stats.pop("wait_time_total")
+        return {
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "checkouts": checkouts,
+            "avg_checkout_ms": round(wait_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+            **stats,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程级共享的连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_pool_stats():
+    """连接池统计信息；连接池尚未创建时返回 None"""
+    return _pool.stats() if _pool is not None else None
+
+
+@contextmanager
+def get_connection():
+    """从连接池借出一个连接，离开 with 块时自动归还"""
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
+
+
+class QueryCache:
+    """
+    按表打标签的查询结果缓存（LRU）
+    每条缓存记录都标注了它读取的表；任何对这些表的写操作都会淘汰对应记录。
+    每张表维护一个版本号：查询开始后表被写过，则这次查询的结果不会写入缓存，避免缓存旧数据。
+    只有本进程的写操作能淘汰记录，因此每条记录最多保留 ttl 秒，其他进程的写入在此之后可见。
+    """
+
+    def __init__(self, maxsize=DB_CACHE_SIZE, ttl=DB_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # {缓存键: (结果, 表名元组, 写入时间)}
+        self._keys_by_table = {}  # {表名: {缓存键}}
+        self._versions = {}  # {表名: 写入次数}
+        self._listeners = {}  # {表名: [回调]}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expirations": 0}
+
+    def get(self, key):
+        """返回 (是否命中, 结果)"""
+        with self._lock:
+            if key in self._entries:
+                result, _, stored_at = self._entries[key]
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, result
+                del self._entries[key]
+                self._forget(key)
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return False, None
+
+    def versions(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def put(self, key, result, tables, versions):
+        with self._lock:
+            if self.maxsize <= 0 or versions != tuple(self._versions.get(table, 0) for table in tables):
+                return
+            self._entries[key] = (result, tables, time.monotonic())
+            self._entries.move_to_end(key)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self._stats["evictions"] += 1
+
+    def _forget(self, key):
+        for keys in self._keys_by_table.values():
+            keys.discard(key)
+
+    def invalidate(self, tables):
+        """淘汰读取过这些表的所有缓存记录，并通知订阅了这些表的回调"""
+        listeners = []
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in self._keys_by_table.pop(table, set()):
+                    if key in self._entries:
+                        _, entry_tables, _ = self._entries.pop(key)
+                        for other in entry_tables:
+                            if other != table:
+                                self._keys_by_table.get(other, set()).discard(key)
+                        self._stats["invalidations"] += 1
+                listeners.extend(self._listeners.get(table, []))
+        for callback in listeners:
+            callback()
+
+    def subscribe(self, table, callback):
+        with self._lock:
+            self._listeners.setdefault(table, []).append(callback)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_size"] = self.maxsize
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+query_cache = QueryCache()
+
+
+def get_cache_stats():
+    """查询结果缓存的命中/未命中等统计信息"""
+    return query_cache.stats()
+
+
+def invalidate_tables(tables):
+    """直接使用连接写入数据后（例如 COPY 导入），手动淘汰相关表的缓存"""
+    query_cache.invalidate({_normalize_table(table) for table in tables})
+
+
+def on_table_change(table, callback):
+    """订阅表的写操作：execute_query 写入该表后调用 callback()"""
+    query_cache.subscribe(_normalize_table(table), callback)
+
+
+def open_transactions(cursor):
+    """
+    当前所有进行中的客户端事务（不含本连接）的虚拟事务号
+    每个事务都持有自己的 virtualxid 锁，包括还没有分配事务号、但已经取走了自增 id 的事务
+    """
+    cursor.execute("""
+        SELECT COALESCE(array_agg(l.virtualxid), '{}')
+        FROM pg_locks l
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.locktype = 'virtualxid' AND a.backend_type = 'client backend' AND l.pid <> pg_backend_pid()
+    """)
+    return cursor.fetchone()[0]
+
+
+def transactions_running(cursor, vxids):
+    """open_transactions() 返回的事务中是否还有没结束的"""
+    if not vxids:
+        return False
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'virtualxid' AND virtualxid = ANY(%s))",
+        (list(vxids),)
+    )
+    return cursor.fetchone()[0]
+
+
+def _normalize_table(name):
+    return name.replace('"', "").split(".")[-1].lower()
+
+
+def written_tables(query):
+    """从写语句中提取被修改的表名"""
+    return {_normalize_table(name) for name in _WRITE_TABLE_RE.findall(query)}
+
+
+def _cache_key(kind, query, params):
+    key = (kind, query, tuple(params) if isinstance(params, list) else params)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _cached_fetch(kind, query, params, cache_tables, run):
+    tables = tuple(sorted(_normalize_table(table) for table in cache_tables))
+    key = _cache_key(kind, query, params)
+    if key is None:
+        return run()
+    hit, result = query_cache.get(key)
+    if hit:
+        if query_stats.enabled:
+            query_stats.record(query, 0.0, 0.0, None, cached=True)
+        return result
+    versions = query_cache.versions(tables)
+    result = run()
+    query_cache.put(key, result, tables, versions)
     return result
 
-def fetch_all(query, params=None):
-    """执行查询并返回所有记录（列表形式，每条记录为字典）"""
-    conn = get_db_connection()
+
+def _copy_row(row):
+    # 缓存中的行可能被调用方修改（例如补充当前价格），每次返回副本
+    return dict(row) if row is not None else None
+
+
+class QueryStats:
+    """
+    按归一化 SQL 汇总的语句统计：调用次数、执行耗时直方图、返回行数、借连接耗时
+    另外按线程记录本次页面运行（一次 Streamlit rerun）执行的语句数，并保留最近的慢查询。
+    enabled 为 False 时各查询函数直接跳过统计，只多一次属性判断。
+    """
+
+    # 直方图各桶的上界（毫秒），最后一个桶收集更慢的语句
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self, enabled=DB_INSTRUMENTATION, slow_ms=DB_SLOW_QUERY_MS, slow_log=DB_SLOW_QUERY_LOG,
+                 recent_slow=50):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._entries = {}  # {归一化 SQL: 统计}
+        self._slow = deque(maxlen=recent_slow)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def record(self, query, elapsed, acquire, rows, cached=False):
+        """记录一次执行（elapsed、acquire 单位为秒）；cached 为 True 表示结果来自查询缓存"""
+        sql = normalize_sql(query)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self._entries.get(sql)
+            if entry is None:
+                entry = self._entries[sql] = {
+                    "calls": 0, "cache_hits": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                    "acquire_ms": 0.0, "histogram": [0] * (len(self.BUCKETS_MS) + 1),
+                }
+            if cached:
+                entry["cache_hits"] += 1
+            else:
+                entry["calls"] += 1
+                entry["total_ms"] += elapsed_ms
+                entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+                entry["rows"] += rows or 0
+                entry["acquire_ms"] += acquire * 1000
+                entry["histogram"][bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None:
+            rerun["queries"] += 1
+            rerun["cache_hits"] += cached
+            rerun["time_ms"] += elapsed_ms
+        if not cached and elapsed_ms >= self.slow_ms:
+            self._log_slow(sql, elapsed_ms, rows)
+
+    def _log_slow(self, sql, elapsed_ms, rows):
+        record = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "ms": round(elapsed_ms, 3), "rows": rows, "sql": sql}
+        with self._lock:
+            self._slow.append(record)
+        line = f"慢查询 {record['ms']} ms, {rows} 行: {sql}"
+        if not self.slow_log:
+            print(line)
+            return
+        try:
+            with open(self.slow_log, "a", encoding="utf-8") as f:
+                f.write(f"{record['at']} {line}\n")
+        except OSError as e:
+            print(f"写入慢查询日志失败: {e}")
+
+    def begin_rerun(self):
+        """在页面脚本开头调用，开始统计本线程本次运行执行的语句"""
+        self._local.rerun = {"queries": 0, "cache_hits": 0, "time_ms": 0.0}
+
+    def rerun_stats(self):
+        """本次页面运行到目前为止的语句数、缓存命中数和执行总耗时；未调用 begin_rerun 时为 None"""
+        rerun = getattr(self._local, "rerun", None)
+        return dict(rerun, time_ms=round(rerun["time_ms"], 3)) if rerun is not None else None
+
+    def _percentile_ms(self, histogram, fraction):
+        target = sum(histogram) * fraction
+        seen = 0
+        for bound, count in zip(self.BUCKETS_MS + (float("inf"),), histogram):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def top(self, limit=20, order_by="total_ms"):
+        """按 order_by 倒序返回前 limit 条语句的统计"""
+        with self._lock:
+            entries = [(sql, dict(entry, histogram=list(entry["histogram"]))) for sql, entry in self._entries.items()]
+        rows = []
+        for sql, entry in entries:
+            calls = entry["calls"]
+            rows.append({
+                "sql": sql,
+                "calls": calls,
+                "cache_hits": entry["cache_hits"],
+                "total_ms": round(entry["total_ms"], 3),
+                "avg_ms": round(entry["total_ms"] / calls, 3) if calls else 0.0,
+                "p95_ms": self._percentile_ms(entry["histogram"], 0.95) if calls else 0.0,
+                "max_ms": round(entry["max_ms"], 3),
+                "avg_rows": round(entry["rows"] / calls, 1) if calls else 0.0,
+                "avg_acquire_ms": round(entry["acquire_ms"] / calls, 3) if calls else 0.0,
+                "histogram": dict(zip([f"<={b}ms" for b in self.BUCKETS_MS] + ["slower"], entry["histogram"])),
+            })
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def slow_queries(self):
+        """最近的慢查询（新的在前）"""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._slow.clear()
+
+
+query_stats = QueryStats()
+
+
+def get_query_stats(limit=20):
+    """按总耗时排序的语句统计，供管理员面板展示"""
+    return query_stats.top(limit)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """把语句中的字面量替换为 ?、合并空白，使同一类语句归到同一条统计下"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", query)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", "(...)", sql)
+    return " ".join(sql.split())
+
+
+def _run_statement(query, params, fetch):
+    """
+    借出连接执行一条语句
+    :param fetch: "one" 返回一条记录，"all" 返回全部记录，None 表示写语句（执行后提交）
+    """
+    if not query_stats.enabled:
+        with get_connection() as conn:
+            return _execute(conn, query, params, fetch)
+
+    start = time.perf_counter()
+    with get_connection() as conn:
+        acquired = time.perf_counter()
+        result = _execute(conn, query, params, fetch)
+        finished = time.perf_counter()
+    if fetch == "one":
+        rows = 1 if result is not None else 0
+    elif fetch == "all":
+        rows = len(result)
+    else:
+        rows = result
+    query_stats.record(query, finished - acquired, acquired - start, rows)
+    return result
+
+
+def _execute(conn, query, params, fetch):
+    if fetch is None:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            conn.commit()
+            return cursor.rowcount
     with conn.cursor(cursor_factory=RealDictCursor) as cursor:
         cursor.execute(query, params)
-        results = cursor.fetchall()
-    conn.close()
-    return results
-
-def execute_query(query, params=None):
-    """执行插入、更新或删除操作"""
-    conn = get_db_connection()
-    with conn.cursor() as cursor:
-        cursor.execute(query, params)
-        conn.commit()
-    conn.close()
\ No newline at end of file
+        return cursor.fetchone() if fetch == "one" else cursor.fetchall()
+
+
+def fetch_one(query, params=None, cache_tables=None):
+    """
+    执行查询并返回单条记录（字典形式）
+    :param cache_tables: 查询读取的表名；传入后结果会被缓存，直到这些表被写入
+    """
+    def run():
+        return _run_statement(query, params, "one")
+
+    if not cache_tables:
+        return run()
+    return _copy_row(_cached_fetch("one", query, params, cache_tables, run))
+
+def fetch_all(query, params=None, cache_tables=None):
+    """
+    执行查询并返回所有记录（列表形式，每条记录为字典）
+    :param cache_tables: 查询读取的表名；传入后结果会被缓存，直到这些表被写入
+    """
+    def run():
+        return _run_statement(query, params, "all")
+
+    if not cache_tables:
+        return run()
+    return [_copy_row(row) for row in _cached_fetch("all", query, params, cache_tables, run)]
+
+def execute_query(query, params=None, invalidates=None):
+    """
+    执行插入、更新或删除操作
+    提交后会淘汰被写入表的缓存；语句中识别不到的表可以通过 invalidates 额外指定
+    :return: 影响的行数
+    """
+    rowcount = _run_statement(query, params, None)
+    tables = written_tables(query) | {_normalize_table(table) for table in (invalidates or ())}
+    if tables:
+        query_cache.invalidate(tables)
+    return rowcount
+
+
+class UnitOfWork:
+    """
+    一组在同一个事务中执行的写操作（通过 unit_of_work() 获取）
+    所有语句共用一个连接、最后只提交一次；任何一步出错都会回滚全部写入。
+    提交后统一淘汰被写入表的缓存并通知订阅者。
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tables = set()
+
+    def _record(self, query, started, rows):
+        if query_stats.enabled:
+            query_stats.record(query, time.perf_counter() - started, 0.0, rows)
+
+    def execute(self, query, params=None):
+        """执行一条写语句，返回影响的行数"""
+        started = time.perf_counter()
+        with self.conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rowcount = cursor.rowcount
+        self._record(query, started, rowcount)
+        self.tables |= written_tables(query)
+        return rowcount
+
+    def insert_many(self, table, columns, rows, returning="id", page_size=1000):
+        """
+        用 execute_values 批量插入多行（每 page_size 行一条 INSERT ... VALUES 语句）
+        :param rows: 与 columns 顺序一致的元组列表
+        :param returning: 需要返回的列，None 表示不返回
+        :return: 按输入顺序排列的 returning 列的值（例如新记录的 id）；returning 为 None 时返回插入行数
+        """
+        rows = list(rows)
+        if not rows:
+            return [] if returning else 0
+        query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        if returning:
+            query += sql.SQL(" RETURNING {}").format(sql.Identifier(returning))
+        started = time.perf_counter()
+        with self.conn.cursor() as cursor:
+            query = query.as_string(cursor)
+            result = execute_values(cursor, query, rows, page_size=page_size, fetch=bool(returning))
+        self._record(query, started, len(rows))
+        self.tables.add(_normalize_table(table))
+        return [row[0] for row in result] if returning else len(rows)
+
+
+@contextmanager
+def unit_of_work(invalidates=None):
+    """
+    在一个事务中执行多条写操作：
+        with unit_of_work() as uow:
+            ids = uow.insert_many("crypto_investments", columns, rows)
+            uow.execute("UPDATE ... WHERE id = %s", (ids[0],))
+    正常离开 with 块时提交，出现异常时回滚并继续抛出
+    :param invalidates: 额外需要淘汰缓存的表
+    """
+    with get_connection() as conn:
+        uow = UnitOfWork(conn)
+        try:
+            yield uow
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    tables = uow.tables | {_normalize_table(table) for table in (invalidates or ())}
+    if tables:
+        query_cache.invalidate(tables)
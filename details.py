@@ -0,0 +1,139 @@
+import argparse
+import json
+from decimal import Decimal
+from psycopg2.extras import execute_values
+from database import get_connection, invalidate_tables
+from tracing import traced
+
+# 写入 investments 表时从 details 中提取的列（见 migrations/004_betting_summary.sql）
+SUMMARY_COLUMNS = ("details_summary", "team_a", "team_b", "game", "selected_bet", "selected_odds")
+
+
+@traced()
+def format_details(details):
+    """将 details 字段转换为更易读的文本格式"""
+    try:
+        if isinstance(details, str):
+            try:
+                details = json.loads(details)
+            except json.JSONDecodeError:
+                return details
+
+        readable_text = []
+        if "team_a" in details and "team_b" in details:
+            team_a_str = (
+                f"{details['team_a']['english_name']} ({details['team_a']['chinese_name']})"
+                if isinstance(details["team_a"], dict) else details["team_a"]
+            )
+            team_b_str = (
+                f"{details['team_b']['english_name']} ({details['team_b']['chinese_name']})"
+                if isinstance(details["team_b"], dict) else details["team_b"]
+            )
+            readable_text.append(f"{team_a_str} vs {team_b_str}")
+
+        if "game" in details:
+            readable_text.append(f"赛制: {details['game']}")
+
+        if "amount" in details:
+            readable_text.append(f"押注金额: ${details['amount']:.2f}")
+
+        if "return_amount" in details:
+            readable_text.append(f"回报金额: ${details['return_amount']:.2f}")
+
+        if "bet_options" in details:
+            bet_options = ", ".join(
+                f"{opt['type']} (赔率: {opt['odds']}, {'已选' if opt['selected'] else '未选'})"
+                for opt in details["bet_options"]
+            )
+            readable_text.append(f"赔率选项: {bet_options}")
+
+        return " | ".join(readable_text) if readable_text else "无详情信息"
+    except Exception as e:
+        print(f"解析 details 字段失败: {e}")
+        return "无法解析详情字段"
+
+
+def _team_name(team):
+    if isinstance(team, dict):
+        return team.get("english_name")
+    return team
+
+
+def summarize_details(details):
+    """
+    写入时预先渲染 details：返回 SUMMARY_COLUMNS 对应的字典
+    details_summary 与 format_details 的输出完全一致，列表页直接展示，不再逐行解析 JSON；
+    其余字段（球队英文名、赛制、选中的投注项及其赔率）可以在 SQL 中筛选和建索引。
+    """
+    summary = dict.fromkeys(SUMMARY_COLUMNS)
+    if details is None:
+        return summary
+    if isinstance(details, str):
+        try:
+            details = json.loads(details)
+        except json.JSONDecodeError:
+            summary["details_summary"] = details
+            return summary
+    summary["details_summary"] = format_details(details)
+    if not isinstance(details, dict):
+        return summary
+
+    summary["team_a"] = _team_name(details.get("team_a"))
+    summary["team_b"] = _team_name(details.get("team_b"))
+    summary["game"] = details.get("game") or None
+    selected = [opt for opt in details.get("bet_options") or [] if isinstance(opt, dict) and opt.get("selected")]
+    summary["selected_bet"] = details.get("selected_bet") or (selected[0].get("type") if selected else None)
+    for opt in selected:
+        if opt.get("type") == summary["selected_bet"] and opt.get("odds") is not None:
+            summary["selected_odds"] = Decimal(str(opt["odds"]))
+            break
+    return summary
+
+
+def backfill_summaries(batch_size=1000, progress=None):
+    """
+    为还没有 details_summary 的记录补齐摘要列（一次性脚本，可重复执行）
+    按 id 分批读取并用 execute_values 批量更新，每批单独提交
+    :return: 更新的行数
+    """
+    updated = 0
+    last_id = 0
+    with get_connection() as conn:
+        while True:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, details FROM investments
+                    WHERE id > %s AND details IS NOT NULL AND details_summary IS NULL
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                values = []
+                for row_id, details in rows:
+                    summary = summarize_details(details)
+                    values.append((row_id, *(summary[column] for column in SUMMARY_COLUMNS)))
+                execute_values(cursor, f"""
+                    UPDATE investments AS i SET
+                        {', '.join(f"{column} = v.{column}" for column in SUMMARY_COLUMNS)}
+                    FROM (VALUES %s) AS v (id, {', '.join(SUMMARY_COLUMNS)})
+                    WHERE i.id = v.id
+                """, values, template="(%s, %s, %s, %s, %s, %s, %s::numeric)")
+            conn.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+            if progress:
+                progress(updated)
+    if updated:
+        invalidate_tables(["investments"])
+    return updated
+
+
+if __name__ == "__main__":
+    # 执行 004 迁移后运行一次: python details.py
+    parser = argparse.ArgumentParser(description="为已有的博彩记录补齐 details 摘要列")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    count = backfill_summaries(args.batch_size, progress=lambda n: print(f"已更新 {n} 行..."))
+    print(f"完成，共更新 {count} 行。")
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from decimal import Decimal
+import datetime
+from valuation import value_lots
+from quotes import ASSET_CLASS_QUOTES, get_all_quotes, normalize_symbol
+
+
+@dataclass
+class LotRecord:
+    """
+    列表中的一条投资记录
+    asset_class 来自查询本身（见 investments.LISTING_SOURCES），决定记录走哪个报价服务：
+    "investment" 为 investments 表中的博彩等记录，不需要取价；"crypto"、"stock" 为持仓记录。
+    """
+    asset_class: str
+    id: int
+    investment_type: str
+    sub_type: str
+    investment_date: datetime.date
+    amount: Decimal = None
+    return_amount: Decimal = None
+    buy_price: Decimal = None
+    quantity: Decimal = None
+    details: object = None
+    details_summary: str = None  # 写入时预先渲染的详情（见 details.summarize_details）
+    current_price: float = None
+    price_missing: str = None  # 取不到价格的原因（见 quotes.QuoteBatch）
+    cost: Decimal = None
+    current_value: Decimal = None
+    pnl: Decimal = None
+    roi: float = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            asset_class=row["asset_class"],
+            id=row["id"],
+            investment_type=row["investment_type"],
+            sub_type=row["sub_type"],
+            investment_date=row["investment_date"],
+            amount=row.get("amount"),
+            return_amount=row.get("return_amount"),
+            buy_price=row.get("buy_price"),
+            quantity=row.get("quantity"),
+            details=row.get("details"),
+            details_summary=row.get("details_summary"),
+        )
+
+    @property
+    def is_priced(self):
+        """是否需要按市场价估值"""
+        return self.asset_class in ASSET_CLASS_QUOTES
+
+    @property
+    def symbol(self):
+        return normalize_symbol(self.sub_type) if self.sub_type else None
+
+
+def fetch_prices(records):
+    """
+    按资产类别路由到对应的报价服务，所有代码并发取价，每个代码只取一次
+    :return: quotes.QuoteBatch
+    """
+    symbols_by_class = {}
+    for record in records:
+        if record.is_priced and record.symbol:
+            symbols_by_class.setdefault(record.asset_class, set()).add(record.symbol)
+    return get_all_quotes(symbols_by_class)
+
+
+def enrich_records(rows):
+    """
+    把查询结果转换成 LotRecord，并为每条持仓记录计算当前价格、成本、当前总价值和盈亏
+    每条记录只会被对应的报价服务取价一次，估值在 valuation 中按列一次算完
+    """
+    records = [LotRecord.from_row(row) for row in rows]
+    priced = [record for record in records if record.is_priced]
+    if not priced:
+        return records
+
+    quotes = fetch_prices(priced)
+    for record in priced:
+        record.current_price = quotes.get(record.asset_class, record.symbol)
+        record.price_missing = quotes.missing.get((record.asset_class, record.symbol))
+    valuation = value_lots(
+        [record.quantity for record in priced],
+        [record.buy_price for record in priced],
+        [record.current_price for record in priced]
+    )
+    for record, cost, current_value, pnl, roi in zip(
+        priced, *(valuation[column].to_pylist() for column in ("cost", "current_value", "pnl", "roi"))
+    ):
+        record.cost, record.current_value, record.pnl, record.roi = cost, current_value, pnl, roi
+    return records
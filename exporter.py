@@ -0,0 +1,301 @@
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import os
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from database import get_connection, open_transactions, transactions_running
+from details import SUMMARY_COLUMNS
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "backups")  # 导出文件目录
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))  # 服务端游标每批读取的行数
+EXPORT_STATE_FILE = "export_state.json"  # 记录每张表增量导出的水位线
+EXPORT_SETTLE_TIMEOUT = float(os.getenv("EXPORT_SETTLE_TIMEOUT", "30"))  # 等待进行中的写事务结束的最长秒数
+
+# 需要导出的表及其导出方式：
+# "append" 只会新增行的表，增量导出时按自增 id 水位线只导出新行；
+# "full" 会被原地修改的表（余额、密码、球队名称等），数据量小，每次都全量导出
+EXPORT_TABLES = {
+    "users": "full",
+    "teams": "full",
+    "investments": "append",
+    "crypto_investments": "append",
+    "stock_investments": "append",
+    "user_predictions": "append",
+}
+
+# 不导出的派生列：写入之后还会被回填更新（见 details.backfill_summaries），增量导出无法反映；
+# 恢复时由 importer 根据 details 重新生成
+EXPORT_SKIPPED_COLUMNS = {
+    "investments": SUMMARY_COLUMNS,
+}
+
+# PostgreSQL 类型 OID -> Arrow 类型；未列出的类型按字符串导出
+_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+_NUMERIC_OID = 1700
+_JSON_OIDS = {114, 3802}
+
+
+def load_state(export_dir=EXPORT_DIR):
+    """
+    读取各表上一次导出的水位线
+    :return: {表名: {"last_id": 已导出的最大 id, "pending_id": 待确认的 id 或 None, "pending_vxids": [...]}}
+    """
+    path = os.path.join(export_dir, EXPORT_STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    # 旧版本的状态文件只记录了水位线本身，也记录了现在每次全量导出的表
+    return {
+        table: value if isinstance(value, dict) else {"last_id": value}
+        for table, value in state.items() if EXPORT_TABLES.get(table) == "append"
+    }
+
+
+def save_state(state, export_dir=EXPORT_DIR):
+    path = os.path.join(export_dir, EXPORT_STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _arrow_schema(description):
+    """根据游标的列描述生成固定的 Arrow schema，保证每一批的类型一致"""
+    fields = []
+    for column in description:
+        # 未限定精度的 NUMERIC 列（precision、scale 为 65535）无法映射到定长 decimal，按字符串精确导出
+        if column.type_code == _NUMERIC_OID and column.scale is not None and 0 <= column.scale <= 38:
+            arrow_type = pa.decimal128(38, column.scale)
+        else:
+            arrow_type = _ARROW_TYPES.get(column.type_code, pa.string())
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _to_text(value, type_code):
+    if value is None:
+        return None
+    if type_code in _JSON_OIDS:
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _batch_to_arrow(rows, schema, description):
+    columns = list(zip(*rows))
+    arrays = []
+    for values, field, column in zip(columns, schema, description):
+        if pa.types.is_string(field.type):
+            values = [_to_text(value, column.type_code) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        self.path = path + ".parquet"
+        self._writer = None
+
+    def write(self, rows, description):
+        if self._writer is None:
+            self._schema = _arrow_schema(description)
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        self._writer.write_batch(_batch_to_arrow(rows, self._schema, description))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.path = path + ".csv.gz"
+        self._file = None
+
+    def write(self, rows, description):
+        if self._file is None:
+            self._file = gzip.open(self.path, "wt", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([column.name for column in description])
+        self._writer.writerows(
+            [_to_text(value, column.type_code) for value, column in zip(row, description)]
+            for row in rows
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+_SINKS = {"parquet": _ParquetSink, "csv": _CsvSink}
+
+
+def _export_columns(conn, table):
+    skipped = EXPORT_SKIPPED_COLUMNS.get(table)
+    if not skipped:
+        return "*"
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+        return ", ".join(f'"{column.name}"' for column in cursor.description if column.name not in skipped)
+
+
+def export_table(conn, table, since, until, file_format, export_dir, batch_rows, progress=None):
+    """
+    通过服务端（命名）游标分批导出一张表，内存占用与表大小无关
+    :param since: 增量导出的起点（只导出 id 大于该值的行），None 表示从头导出
+    :param until: 只导出 id 不超过该值的行，None 表示不限
+    :return: (导出行数, 文件路径或 None)
+    """
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("id > %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("id <= %s")
+        params.append(until)
+    condition = "WHERE " + " AND ".join(conditions) if conditions else ""
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} {condition}", params)
+        total = cursor.fetchone()[0]
+    if progress:
+        progress(table, 0, total)
+    if total == 0:
+        return 0, None
+
+    table_dir = os.path.join(export_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    sink = _SINKS[file_format](os.path.join(table_dir, f"{table}_{timestamp}_{'incr' if since is not None else 'full'}"))
+
+    exported = 0
+    columns = _export_columns(conn, table)
+    try:
+        with conn.cursor(name=f"export_{table}") as cursor:
+            cursor.itersize = batch_rows
+            cursor.execute(f"SELECT {columns} FROM {table} {condition} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                sink.write(rows, cursor.description)
+                exported += len(rows)
+                if progress:
+                    progress(table, exported, total)
+    finally:
+        sink.close()
+    return exported, sink.path
+
+
+def _settle_boundaries(conn, tables, state, timeout):
+    """
+    确定每张追加表这次可以导出到的 id 上限
+    自增 id 在事务提交之前就已分配，某一时刻的 MAX(id) 之下可能还有未提交的行（例如正在进行的 COPY 导入）。
+    先读各表的 MAX(id)，再记下当时所有进行中的事务；这些事务全部结束后，不超过该 id 的行都已确定。
+    最多等待 timeout 秒；等不到时本次只导出到上一次已确认的位置，新的位置留给下次导出确认。
+    必须在导出快照开始之前调用，保证已结束事务写入的行都在快照中。
+    :return: {表名: 本次导出的 id 上限}，并就地更新 state 中的待确认位置
+    """
+    boundaries = {}
+    with conn.cursor() as cursor:
+        max_ids = {}
+        for table in tables:
+            entry = state.setdefault(table, {"last_id": None})
+            boundaries[table] = entry.get("last_id")
+            if entry.get("pending_id") is not None and not transactions_running(cursor, entry.get("pending_vxids")):
+                boundaries[table] = entry["pending_id"]
+                entry["pending_id"] = entry["pending_vxids"] = None
+            if entry.get("pending_id") is None:
+                cursor.execute(f"SELECT MAX(id) FROM {table}")
+                max_ids[table] = cursor.fetchone()[0]
+
+        if max_ids:
+            vxids = open_transactions(cursor)
+            deadline = time.monotonic() + timeout
+            while transactions_running(cursor, vxids) and time.monotonic() < deadline:
+                time.sleep(0.5)
+            settled = not transactions_running(cursor, vxids)
+            for table, max_id in max_ids.items():
+                if max_id is None or (boundaries[table] is not None and max_id <= boundaries[table]):
+                    continue
+                if settled:
+                    boundaries[table] = max_id
+                else:
+                    state[table].update(pending_id=max_id, pending_vxids=vxids)
+    conn.commit()
+    return boundaries
+
+
+def export_database(incremental=True, file_format="parquet", export_dir=EXPORT_DIR,
+                    batch_rows=EXPORT_BATCH_ROWS, tables=None, progress=None, settle_timeout=EXPORT_SETTLE_TIMEOUT):
+    """
+    导出数据库中的业务表
+    所有表在同一个只读的可重复读事务中导出，得到一致的快照。
+    追加表只导出到已确认没有未提交行的 id 为止（见 _settle_boundaries），之后的行留给下次增量导出；
+    会被原地修改的表每次都全量导出。
+    :param incremental: True 时追加表只导出上次水位线之后的新行；首次运行或 False 时全量导出
+    :param progress: 可选回调 progress(表名, 已导出行数, 总行数)
+    :param settle_timeout: 等待进行中的写事务结束的最长秒数（页面上调用时应传较短的值）
+    :return: {表名: {"rows": 行数, "file": 文件路径或 None, "deferred": 是否有新行因写事务未结束而留给下次导出}}
+    """
+    if file_format not in _SINKS:
+        raise ValueError(f"不支持的导出格式: {file_format}")
+    os.makedirs(export_dir, exist_ok=True)
+    tables = list(tables or EXPORT_TABLES)
+    state = load_state(export_dir) if incremental else {}
+    results = {}
+    with get_connection() as conn:
+        append_tables = [table for table in tables if EXPORT_TABLES[table] == "append"]
+        boundaries = _settle_boundaries(conn, append_tables, state, settle_timeout)
+        with conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        for table in tables:
+            if table not in boundaries:
+                rows, path = export_table(conn, table, None, None, file_format, export_dir, batch_rows, progress)
+            elif boundaries[table] is None:
+                # 表中还没有已确认的行，留给下次导出
+                rows, path = 0, None
+            else:
+                rows, path = export_table(
+                    conn, table, state[table]["last_id"], boundaries[table], file_format, export_dir, batch_rows, progress
+                )
+            results[table] = {
+                "rows": rows, "file": path, "deferred": state.get(table, {}).get("pending_id") is not None,
+            }
+        conn.rollback()
+    # 所有文件写完后才推进水位线，导出中途失败时下次会从原水位线重新导出
+    for table, boundary in boundaries.items():
+        state[table]["last_id"] = boundary
+    save_state(state, export_dir)
+    return results
+
+
+if __name__ == "__main__":
+    # 适合放在定时任务中运行: python exporter.py [--full] [--format csv]
+    parser = argparse.ArgumentParser(description="导出数据库业务表")
+    parser.add_argument("--full", action="store_true", help="忽略水位线，全量导出")
+    parser.add_argument("--format", choices=list(_SINKS), default="parquet")
+    parser.add_argument("--dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+    summary = export_database(incremental=not args.full, file_format=args.format, export_dir=args.dir)
+    for table_name, result in summary.items():
+        print(f"{table_name}: {result['rows']} 行 -> {result['file'] or '无新数据'}")
+        if result["deferred"]:
+            print(f"{table_name}: 有写事务尚未结束，之后的新行留给下次导出")
@@ -0,0 +1,205 @@
+import io
+import json
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from database import get_connection, invalidate_tables
+from details import backfill_summaries
+from analytics import rebuild_rollups
+
+IMPORT_CHUNK_ROWS = 50000  # 每批校验和 COPY 的行数
+MAX_REPORTED_ERRORS = 20
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+
+# 按文本严格校验，不经过浮点数：整数不丢精度，inf、nan 等 COPY 无法写入的值直接报错
+INT_PATTERN = r"[+-]?\d+"
+NUMERIC_PATTERN = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d{1,3})?"
+# 只接受 ISO 格式的日期（YYYY-MM-DD），01/02/2024 这类写法无法确定月和日的顺序
+DATE_PATTERN = r"\d{4}-\d{2}-\d{2}"
+
+# 可导入的表：列名 -> (类型, 是否必填)；id 列可选，存在时按原 id 导入（用于从备份恢复）
+IMPORT_TABLES = {
+    "investments": {
+        "id": ("int", False),
+        "user_id": ("int", True),
+        "investment_type": ("text", True),
+        "sub_type": ("text", False),
+        "amount": ("numeric", True),
+        "return_amount": ("numeric", False),
+        "investment_date": ("date", True),
+        "details": ("json", False),
+    },
+    "crypto_investments": {
+        "id": ("int", False),
+        "user_id": ("int", True),
+        "sub_type": ("text", True),
+        "buy_price": ("numeric", True),
+        "quantity": ("numeric", True),
+        "investment_date": ("date", True),
+    },
+    "stock_investments": {
+        "id": ("int", False),
+        "user_id": ("int", True),
+        "sub_type": ("text", True),
+        "buy_price": ("numeric", True),
+        "quantity": ("numeric", True),
+        "investment_date": ("date", True),
+    },
+}
+
+
+class ImportValidationError(Exception):
+    """导入文件中存在无效数据，整个导入已回滚"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"导入数据校验失败，共 {len(errors)} 处错误（已全部回滚）")
+
+
+def iter_chunks(file, file_format, chunksize=IMPORT_CHUNK_ROWS):
+    """
+    按批读取 CSV 或 Parquet 文件，每批返回一个所有列都是字符串（缺失为 NaN/None）的 DataFrame
+    数值保持原始文本，导入时不会经过浮点数
+    """
+    if file_format == "csv":
+        yield from pd.read_csv(file, dtype=str, keep_default_na=False, na_values=[""], chunksize=chunksize)
+    elif file_format == "parquet":
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize):
+            columns = [
+                pc.cast(column, pa.string()) if not pa.types.is_string(column.type) else column
+                for column in batch.columns
+            ]
+            yield pa.RecordBatch.from_arrays(columns, names=batch.schema.names).to_pandas()
+    else:
+        raise ValueError(f"不支持的文件格式: {file_format}")
+
+
+def _in_bigint_range(value):
+    return BIGINT_MIN <= int(value) <= BIGINT_MAX
+
+
+def _is_json(value):
+    try:
+        json.loads(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_chunk(table, chunk, first_row):
+    """
+    校验并规范化一批数据
+    :param first_row: 本批第一行在文件中的行号（用于错误提示）
+    :return: (可直接 COPY 的 DataFrame, 错误信息列表)
+    """
+    spec = IMPORT_TABLES[table]
+    errors = []
+    unknown = [column for column in chunk.columns if column not in spec]
+    if unknown:
+        errors.append(f"未知的列: {', '.join(unknown)}")
+    missing = [column for column, (_, required) in spec.items() if required and column not in chunk.columns]
+    if missing:
+        errors.append(f"缺少必填列: {', '.join(missing)}")
+    if errors:
+        return None, errors
+
+    clean = pd.DataFrame(index=chunk.index)
+    for column in [column for column in spec if column in chunk.columns]:
+        kind, required = spec[column]
+        values = chunk[column].str.strip()
+        present = values.notna() & (values != "")
+        if kind == "int":
+            invalid = present & ~values.str.fullmatch(INT_PATTERN, na=False)
+            # 不超过 18 位的整数一定在 bigint 范围内，更长的才逐个检查
+            long_values = present & ~invalid & (values.str.lstrip("+-").str.lstrip("0").str.len() > 18)
+            if long_values.any():
+                invalid |= long_values & ~values.where(long_values, "0").map(_in_bigint_range)
+            clean[column] = values.where(present & ~invalid)
+        elif kind == "numeric":
+            invalid = present & ~values.str.fullmatch(NUMERIC_PATTERN, na=False)
+            clean[column] = values.where(present & ~invalid)
+        elif kind == "date":
+            parsed = pd.to_datetime(values.where(values.str.fullmatch(DATE_PATTERN, na=False)),
+                                    errors="coerce", format="%Y-%m-%d")
+            invalid = present & parsed.isna()
+            clean[column] = parsed.dt.strftime("%Y-%m-%d").where(present & ~invalid)
+        elif kind == "json":
+            invalid = present & ~values.where(present, "null").map(_is_json)
+            clean[column] = values.where(present)
+        else:
+            invalid = pd.Series(False, index=values.index)
+            clean[column] = values.where(present)
+
+        if required:
+            invalid |= ~present
+        for position in invalid[invalid].index[:MAX_REPORTED_ERRORS]:
+            errors.append(f"第 {first_row + position - chunk.index[0]} 行，列 {column}: 无效值 {chunk[column][position]!r}")
+    return clean, errors
+
+
+def import_file(table, file, file_format, chunksize=IMPORT_CHUNK_ROWS, progress=None):
+    """
+    批量导入投资记录：逐批校验后用 COPY 写入，全部数据在同一个事务中提交
+    任意一批校验失败都会回滚整个导入并抛出 ImportValidationError
+    :param progress: 可选回调 progress(已导入行数)
+    :return: 导入的行数
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"不支持导入的表: {table}")
+
+    imported = 0
+    has_id = False
+    with get_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                for chunk in iter_chunks(file, file_format, chunksize):
+                    clean, errors = validate_chunk(table, chunk, imported + 1)
+                    if errors:
+                        raise ImportValidationError(errors[:MAX_REPORTED_ERRORS])
+                    has_id = has_id or "id" in clean.columns
+                    buffer = io.StringIO()
+                    clean.to_csv(buffer, index=False, header=False, na_rep="")
+                    buffer.seek(0)
+                    cursor.copy_expert(
+                        f"COPY {table} ({', '.join(clean.columns)}) FROM STDIN WITH (FORMAT csv)",
+                        buffer
+                    )
+                    imported += len(clean)
+                    if progress:
+                        progress(imported)
+                if has_id:
+                    # 按原 id 导入后，把自增序列推进到最大 id 之后
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+                    )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if table == "investments":
+        # 为新导入的博彩记录补齐 details 摘要列
+        backfill_summaries()
+    if has_id:
+        # 按原 id 导入的行可能落在预聚合水位线之前，增量刷新不会再读到它们
+        rebuild_rollups()
+    invalidate_tables([table])
+    return imported
+
+
+if __name__ == "__main__":
+    # 命令行用法: python importer.py <表名> <文件路径>
+    if len(sys.argv) != 3:
+        print(f"用法: python importer.py <{'|'.join(IMPORT_TABLES)}> <文件.csv|文件.parquet>")
+        sys.exit(1)
+    table_name, path = sys.argv[1], sys.argv[2]
+    file_format = "parquet" if path.endswith(".parquet") else "csv"
+    try:
+        count = import_file(table_name, path, file_format, progress=lambda n: print(f"已导入 {n} 行"))
+        print(f"导入完成，共 {count} 行")
+    except ImportValidationError as e:
+        print(e)
+        for error in e.errors:
+            print(f"  - {error}")
+        sys.exit(1)
@@ -1,4 +1,11 @@
+from decimal import Decimal
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from database import fetch_all
+from analytics import get_user_summary
+from quotes import get_all_quotes
+from valuation import DECIMAL128_MAX_PRECISION, value_positions, value_returns
 
 def get_user_investments(user_id):
     """获取用户的全部投资记录"""
@@ -10,22 +17,8 @@ def get_user_investments(user_id):
     return fetch_all(query, (user_id,))
 
 def calculate_user_stats(user_id):
-    """计算用户的总投资、总回报、净收益和 ROI"""
-    query = """
-        SELECT SUM(amount), SUM(return_amount)
-        FROM investments
-        WHERE user_id = %s
-    """
-    result = fetch_all(query, (user_id,))
-    total_investment, total_return = result[0]
-    net_profit = total_return - total_investment if total_investment else 0
-    roi = (net_profit / total_investment * 100) if total_investment else 0
-    return {
-        "total_investment": total_investment or 0,
-        "total_return": total_return or 0,
-        "net_profit": net_profit,
-        "roi": roi
-    }
+    """计算用户的总投资、总回报、净收益和 ROI（从预聚合表读取，不扫描原始记录）"""
+    return get_user_summary(user_id)
 
 def filter_investments(user_id, investment_type=None, start_date=None, end_date=None):
     """根据条件筛选投资记录"""
@@ -53,17 +46,286 @@ def filter_investments(user_id, investment_type=None, start_date=None, end_date=
     # 执行查询
     results = fetch_all(query, tuple(params))
     
-    # 确保返回的数据包含所有需要的字段
+    # 金额保持数据库中的精确小数，净收益和收益率按列批量计算（结果不限行数）
+    returns = value_returns(
+        [row["amount"] for row in results],
+        [row["return_amount"] for row in results]
+    )
     filtered_investments = []
-    for row in results:
+    for row, net_profit, roi in zip(results, returns["net_profit"].to_pylist(), returns["roi"].to_pylist()):
         filtered_investments.append({
             "id": row["id"],
             "investment_type": row["investment_type"],
             "sub_type": row["sub_type"],
-            "amount": float(row["amount"]),  # 确保金额是浮点数
-            "return_amount": float(row["return_amount"]),  # 确保回报金额是浮点数
+            "amount": row["amount"],
+            "return_amount": row["return_amount"],
+            "net_profit": net_profit,
+            "roi": roi,
             "investment_date": row["investment_date"].strftime("%Y-%m-%d"),  # 格式化日期
             "details": row["details"]  # 保留原始 JSON 数据
         })
     
-    return filtered_investments
\ No newline at end of file
+    return filtered_investments
+
+def get_user_holdings(user_id):
+    """
+    按（资产类别, 代码）汇总用户的虚拟币和股票持仓
+    一次分组查询返回每个代码的净数量、成本和买入笔数，后续按代码而不是按笔取价
+    """
+    query = """
+        SELECT 'crypto' AS asset_class, UPPER(TRIM(sub_type)) AS symbol,
+               SUM(quantity) AS quantity, SUM(buy_price * quantity) AS cost_basis, COUNT(*) AS lots
+        FROM crypto_investments
+        WHERE user_id = %s
+        GROUP BY UPPER(TRIM(sub_type))
+        UNION ALL
+        SELECT 'stock' AS asset_class, UPPER(TRIM(sub_type)) AS symbol,
+               SUM(quantity) AS quantity, SUM(buy_price * quantity) AS cost_basis, COUNT(*) AS lots
+        FROM stock_investments
+        WHERE user_id = %s
+        GROUP BY UPPER(TRIM(sub_type))
+    """
+    return fetch_all(query, (user_id, user_id))
+
+def _symbols_by_class(holdings):
+    symbols_by_class = {}
+    for holding in holdings:
+        symbols_by_class.setdefault(holding["asset_class"], set()).add(holding["symbol"])
+    return symbols_by_class
+
+def value_holdings(holdings):
+    """
+    为汇总后的持仓补充当前价格、当前总价值和盈亏
+    所有代码并发取价（每个代码只取一次），估值在 valuation 中按列批量计算。
+    取不到价格（超时或失败）的持仓 current_value 为 None，price_missing 为缺失原因
+    """
+    quotes = get_all_quotes(_symbols_by_class(holdings))
+    current_prices = [quotes.get(holding["asset_class"], holding["symbol"]) for holding in holdings]
+    valuation = value_positions(
+        [holding["quantity"] for holding in holdings],
+        [holding["cost_basis"] for holding in holdings],
+        current_prices
+    )
+    valued = []
+    for holding, current_price, current_value, pnl, roi in zip(
+        holdings, current_prices,
+        *(valuation[column].to_pylist() for column in ("current_value", "pnl", "roi"))
+    ):
+        valued.append({
+            **holding,
+            "current_price": current_price,
+            "current_value": current_value,
+            "pnl": pnl,
+            "roi": roi,
+            "price_missing": quotes.missing.get((holding["asset_class"], holding["symbol"])),
+        })
+    return valued
+
+# 投资记录列表的数据来源：资产类别 -> (表名, 该表映射到统一列的 SELECT 片段)
+LISTING_SOURCES = {
+    "investment": ("investments", """
+        SELECT 'investment' AS asset_class, id, investment_type, sub_type, amount, return_amount,
+               NULL AS buy_price, NULL AS quantity, investment_date, details, details_summary
+    """),
+    "crypto": ("crypto_investments", """
+        SELECT 'crypto' AS asset_class, id, '虚拟币' AS investment_type, sub_type, buy_price * quantity AS amount,
+               NULL AS return_amount, buy_price, quantity, investment_date, NULL AS details,
+               NULL AS details_summary
+    """),
+    "stock": ("stock_investments", """
+        SELECT 'stock' AS asset_class, id, '股票' AS investment_type, sub_type, buy_price * quantity AS amount,
+               NULL AS return_amount, buy_price, quantity, investment_date, NULL AS details,
+               NULL AS details_summary
+    """),
+}
+
+def _keyset_condition(asset_class, cursor, direction):
+    """
+    把合并结果上的 (investment_date, asset_class, id) 游标条件改写成单表条件
+    每张表内 asset_class 是常量，条件可以直接走 (user_id, investment_date, id) 索引
+    """
+    cursor_date, cursor_class, cursor_id = cursor
+    before = direction == "next"  # 列表按倒序排列，下一页取游标之前（更小）的记录
+    if asset_class == cursor_class:
+        return f"(investment_date, id) {'<' if before else '>'} (%s, %s)", [cursor_date, cursor_id]
+    if (asset_class < cursor_class) == before:
+        return f"investment_date {'<=' if before else '>='} %s", [cursor_date]
+    return f"investment_date {'<' if before else '>'} %s", [cursor_date]
+
+def list_investments_page(user_id, asset_classes, start_date, end_date, investment_type=None,
+                          cursor=None, direction="next", page_size=50, team=None, game=None):
+    """
+    服务端 keyset 分页的投资记录列表（合并 investments、crypto_investments、stock_investments）
+    记录按 (investment_date, asset_class, id) 倒序排列，每次只读取一页数据。
+    :param asset_classes: 需要包含的来源，取值见 LISTING_SOURCES
+    :param investment_type: 只对 investments 表生效的投资类型筛选
+    :param team: 球队英文名，只返回该球队参与的博彩记录（走 team_a / team_b 列）
+    :param game: 赛制，只返回该赛制的博彩记录
+    :param cursor: 上一次返回的 next_cursor 或 prev_cursor，None 表示第一页
+    :param direction: "next" 向后翻页，"prev" 向前翻页
+    :return: {"rows": 本页记录, "next_cursor": 下一页游标或 None, "prev_cursor": 上一页游标或 None}
+    """
+    descending = direction == "next"
+    order = "DESC" if descending else "ASC"
+    branches = []
+    params = []
+    if team or game:
+        # 球队和赛制只存在于博彩记录中
+        asset_classes = [asset_class for asset_class in asset_classes if asset_class == "investment"]
+    for asset_class in asset_classes:
+        table, select = LISTING_SOURCES[asset_class]
+        conditions = ["user_id = %s", "investment_date BETWEEN %s AND %s"]
+        branch_params = [user_id, start_date, end_date]
+        if asset_class == "investment" and investment_type:
+            conditions.append("investment_type = %s")
+            branch_params.append(investment_type)
+        if team:
+            conditions.append("(team_a = %s OR team_b = %s)")
+            branch_params += [team, team]
+        if game:
+            conditions.append("game = %s")
+            branch_params.append(game)
+        if cursor is not None:
+            condition, cursor_params = _keyset_condition(asset_class, cursor, direction)
+            conditions.append(condition)
+            branch_params += cursor_params
+        # 每个分支先各自取 page_size + 1 条，合并后再截取一页
+        branches.append(f"""
+            ({select}
+             FROM {table}
+             WHERE {' AND '.join(conditions)}
+             ORDER BY investment_date {order}, id {order}
+             LIMIT %s)
+        """)
+        params += branch_params + [page_size + 1]
+
+    if not branches:
+        return {"rows": [], "next_cursor": None, "prev_cursor": None}
+
+    query = f"""
+        SELECT * FROM ({' UNION ALL '.join(branches)}) AS merged
+        ORDER BY investment_date {order}, asset_class {order}, id {order}
+        LIMIT %s
+    """
+    rows = fetch_all(query, tuple(params + [page_size + 1]))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not descending:
+        rows.reverse()
+
+    def key(row):
+        return (row["investment_date"], row["asset_class"], row["id"])
+
+    if not rows:
+        return {"rows": [], "next_cursor": None, "prev_cursor": None}
+    if descending:
+        next_cursor = key(rows[-1]) if has_more else None
+        prev_cursor = key(rows[0]) if cursor is not None else None
+    else:
+        next_cursor = key(rows[-1])
+        prev_cursor = key(rows[0]) if has_more else None
+    return {"rows": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+# 排行榜中按用户汇总的持仓列
+HOLDINGS_TOTALS = ["crypto_value", "stock_value", "holdings_cost", "holdings_value", "holdings_pnl"]
+
+def _widen(array):
+    """分组求和前放宽到最大精度，避免累加结果超出原列的精度"""
+    if pa.types.is_decimal128(array.type):
+        return array.cast(pa.decimal128(DECIMAL128_MAX_PRECISION, array.type.scale))
+    return array
+
+def calculate_users_stats(user_ids=None):
+    """
+    批量计算多个用户的统计数据，用于管理员排行榜
+    一次分组查询取回每个用户的已实现投资/回报和按代码汇总的持仓，所有持仓统一取价一次。
+    :param user_ids: 用户 id 列表，None 表示所有非管理员用户
+    :return: pandas.DataFrame，每个用户一行：user_id、username、total_investment、total_return、
+             net_profit、roi、crypto_value、stock_value、holdings_cost、holdings_value、holdings_pnl、symbols
+             （holdings_value 和 holdings_pnl 只统计取到价格的持仓）
+    """
+    user_filter = "AND id = ANY(%s)" if user_ids is not None else ""
+    query = f"""
+        WITH selected_users AS (
+            SELECT id, username FROM users WHERE role != 'admin' {user_filter}
+        ),
+        realized AS (
+            SELECT user_id, SUM(amount) AS total_investment, SUM(return_amount) AS total_return
+            FROM investments
+            WHERE user_id IN (SELECT id FROM selected_users)
+            GROUP BY user_id
+        ),
+        holdings AS (
+            SELECT user_id, 'crypto' AS asset_class, UPPER(TRIM(sub_type)) AS symbol,
+                   SUM(quantity) AS quantity, SUM(buy_price * quantity) AS cost_basis
+            FROM crypto_investments
+            WHERE user_id IN (SELECT id FROM selected_users)
+            GROUP BY user_id, UPPER(TRIM(sub_type))
+            UNION ALL
+            SELECT user_id, 'stock' AS asset_class, UPPER(TRIM(sub_type)) AS symbol,
+                   SUM(quantity) AS quantity, SUM(buy_price * quantity) AS cost_basis
+            FROM stock_investments
+            WHERE user_id IN (SELECT id FROM selected_users)
+            GROUP BY user_id, UPPER(TRIM(sub_type))
+        )
+        SELECT u.id AS user_id, u.username, r.total_investment, r.total_return,
+               h.asset_class, h.symbol, h.quantity, h.cost_basis
+        FROM selected_users u
+        LEFT JOIN realized r ON r.user_id = u.id
+        LEFT JOIN holdings h ON h.user_id = u.id
+        ORDER BY u.id
+    """
+    rows = fetch_all(query, (list(user_ids),) if user_ids is not None else None)
+    columns = [
+        "user_id", "username", "total_investment", "total_return", "net_profit", "roi",
+        "crypto_value", "stock_value", "holdings_cost", "holdings_value", "holdings_pnl", "symbols",
+    ]
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    # 每个用户一行的已实现收益；分组查询的结果里每个持仓代码都会重复一次用户行
+    users = {row["user_id"]: row for row in rows}
+    user_id_array = pa.array(list(users), type=pa.int64())
+    returns = value_returns(
+        [row["total_investment"] or Decimal("0") for row in users.values()],
+        [row["total_return"] or Decimal("0") for row in users.values()]
+    )
+
+    # 所有用户的持仓合并后只取价一次，按列估值后在 Arrow 中按用户分组求和
+    holdings = [row for row in rows if row["asset_class"] is not None]
+    quotes = get_all_quotes(_symbols_by_class(holdings))
+    valuation = value_positions(
+        [h["quantity"] for h in holdings],
+        [h["cost_basis"] for h in holdings],
+        [quotes.get(h["asset_class"], h["symbol"]) for h in holdings]
+    )
+    asset_classes = pa.array([h["asset_class"] for h in holdings], type=pa.string())
+    current_value = _widen(valuation["current_value"])
+    no_value = pa.scalar(None, current_value.type)
+    grouped = pa.table({
+        "user_id": pa.array([h["user_id"] for h in holdings], type=pa.int64()),
+        "holdings_cost": _widen(valuation["cost"]),
+        # 只统计取到价格的持仓：未取到价格的行 current_value 为 null，求和时被忽略
+        "holdings_value": current_value,
+        "holdings_pnl": _widen(valuation["pnl"]),
+        "crypto_value": pc.if_else(pc.equal(asset_classes, "crypto"), current_value, no_value),
+        "stock_value": pc.if_else(pc.equal(asset_classes, "stock"), current_value, no_value),
+    }).group_by("user_id").aggregate(
+        [(column, "sum") for column in HOLDINGS_TOTALS] + [("user_id", "count")]
+    )
+
+    # 没有持仓的用户在分组结果中不存在，按 user_id 对齐后补 0
+    positions = pc.index_in(user_id_array, value_set=grouped["user_id"])
+    frame = pd.DataFrame({
+        "user_id": user_id_array.to_pylist(),
+        "username": [row["username"] for row in users.values()],
+        "total_investment": [row["total_investment"] or Decimal("0") for row in users.values()],
+        "total_return": [row["total_return"] or Decimal("0") for row in users.values()],
+        "net_profit": returns["net_profit"].to_pylist(),
+        "roi": pc.fill_null(returns["roi"], 0.0).to_pylist(),
+    })
+    for column in HOLDINGS_TOTALS:
+        totals = pc.take(grouped[f"{column}_sum"], positions).to_pylist()
+        frame[column] = [Decimal("0") if total is None else total for total in totals]
+    frame["symbols"] = pc.fill_null(pc.take(grouped["user_id_count"], positions), 0).to_pylist()
+    return frame[columns]
@@ -0,0 +1,48 @@
+import os
+from database import get_connection
+
+# 数据库迁移脚本所在目录，文件按文件名顺序执行（001_xxx.sql、002_xxx.sql ...）
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def pending_migrations(applied):
+    """返回尚未执行的迁移文件名（按顺序）"""
+    files = sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+    return [name for name in files if name not in applied]
+
+
+def apply_migrations():
+    """执行所有未执行的迁移，每个文件在独立事务中执行并记录到 schema_migrations 表"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version TEXT PRIMARY KEY,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+
+        executed = []
+        for name in pending_migrations(applied):
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+                sql = f.read()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql)
+                    cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (name,))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"迁移 {name} 执行失败: {e}")
+                raise
+            print(f"已执行迁移: {name}")
+            executed.append(name)
+    return executed
+
+
+if __name__ == "__main__":
+    if not apply_migrations():
+        print("数据库已是最新版本。")
@@ -0,0 +1,9 @@
+-- 投资记录列表按 (investment_date, id) 做 keyset 分页，三张表都需要对应的复合索引
+CREATE INDEX IF NOT EXISTS idx_investments_user_date_id
+    ON investments (user_id, investment_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_crypto_investments_user_date_id
+    ON crypto_investments (user_id, investment_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_stock_investments_user_date_id
+    ON stock_investments (user_id, investment_date DESC, id DESC);
@@ -0,0 +1,22 @@
+-- 投资记录按 (来源表, 用户, 投资类型, 子类型, 月份) 的预聚合表，由 analytics.refresh_rollups() 增量维护
+CREATE TABLE IF NOT EXISTS investment_rollups (
+    source TEXT NOT NULL,               -- investments / crypto_investments / stock_investments
+    user_id INT NOT NULL,
+    investment_type TEXT NOT NULL,
+    sub_type TEXT NOT NULL DEFAULT '',
+    month DATE NOT NULL,                -- 当月第一天
+    lot_count BIGINT NOT NULL DEFAULT 0,
+    total_amount NUMERIC NOT NULL DEFAULT 0,
+    total_return NUMERIC,               -- 虚拟币和股票没有已实现回报，为 NULL
+    PRIMARY KEY (source, user_id, investment_type, sub_type, month)
+);
+
+CREATE INDEX IF NOT EXISTS idx_investment_rollups_user_month
+    ON investment_rollups (user_id, month);
+
+-- 每个来源表已聚合到的最大 id
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    source TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,8 @@
+-- 最新行情价格，由 price_refresher.py 定时写入；页面从这里读价格，请求路径中不访问交易所
+CREATE TABLE IF NOT EXISTS latest_prices (
+    asset_class TEXT NOT NULL,          -- crypto / stock
+    symbol TEXT NOT NULL,               -- 统一为大写的代码（如 BTC、AAPL）
+    price NUMERIC NOT NULL,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (asset_class, symbol)
+);
@@ -0,0 +1,13 @@
+-- 写入时从 details JSON 中提取的博彩摘要列，列表页直接读取，不再逐行解析 JSON
+-- 新记录由 admin_dashboard 写入，已有记录运行 python details.py 补齐
+ALTER TABLE investments
+    ADD COLUMN IF NOT EXISTS details_summary TEXT,   -- 与 details.format_details 的输出一致
+    ADD COLUMN IF NOT EXISTS team_a TEXT,            -- 球队英文名
+    ADD COLUMN IF NOT EXISTS team_b TEXT,
+    ADD COLUMN IF NOT EXISTS game TEXT,              -- 赛制（如 NHL、NBA）
+    ADD COLUMN IF NOT EXISTS selected_bet TEXT,
+    ADD COLUMN IF NOT EXISTS selected_odds NUMERIC;
+
+CREATE INDEX IF NOT EXISTS idx_investments_team_a ON investments (team_a) WHERE team_a IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_investments_team_b ON investments (team_b) WHERE team_b IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_investments_game ON investments (game, investment_date) WHERE game IS NOT NULL;
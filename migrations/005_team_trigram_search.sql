@@ -0,0 +1,13 @@
+-- 球队名称的三元组（pg_trgm）GIN 索引，支撑 teams.search_teams_db 的服务端子串检索
+-- 没有安装 pg_trgm 扩展的实例跳过建索引，检索会退回到进程内索引（teams.search_teams）
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_teams_english_name_trgm ON teams USING gin (lower(english_name) gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_teams_chinese_name_trgm ON teams USING gin (chinese_name gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm 扩展不可用，跳过球队名称三元组索引';
+    END IF;
+END
+$$;
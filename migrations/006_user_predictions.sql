@@ -0,0 +1,18 @@
+-- 用户的预测项目，每个项目一行；添加项目只插入一行，不再整体改写 users.predictions
+CREATE TABLE IF NOT EXISTS user_predictions (
+    id BIGSERIAL UNIQUE,                -- 单调递增，作为增量导出的水位线
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    project TEXT NOT NULL,              -- 项目名称（如 NBA、NHL）
+    data JSONB NOT NULL DEFAULT '{}',   -- 项目下的预测内容
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, project)
+);
+
+-- 回填 users.predictions 中已有的项目（旧列保留，便于回滚）
+INSERT INTO user_predictions (user_id, project, data)
+SELECT u.id, p.key, p.value
+FROM users AS u
+CROSS JOIN LATERAL jsonb_each(u.predictions::text::jsonb) AS p
+WHERE u.predictions IS NOT NULL
+  AND jsonb_typeof(u.predictions::text::jsonb) = 'object'
+ON CONFLICT (user_id, project) DO NOTHING;
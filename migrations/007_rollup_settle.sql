@@ -0,0 +1,9 @@
+-- 预聚合水位线改为两步推进（见 analytics._refresh_source）：
+-- 先记下待确认的最大 id 和当时所有进行中事务的虚拟事务号，等这些事务全部结束后再把该区间计入预聚合表
+ALTER TABLE rollup_watermarks
+    ADD COLUMN IF NOT EXISTS pending_id BIGINT,
+    ADD COLUMN IF NOT EXISTS pending_vxids TEXT[];
+
+-- 旧的水位线可能已经越过了提交较晚的行，清空后按新规则重新聚合
+DELETE FROM investment_rollups;
+DELETE FROM rollup_watermarks;
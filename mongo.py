@@ -0,0 +1,113 @@
+import os
+import threading
+import pymongo
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+# 获取 MongoDB 配置
+MONGO_HOST = os.getenv("MONGO_HOST", "mongodb://localhost:27017/")  # 默认的 MongoDB 连接字符串
+MONGO_DB = os.getenv("MONGO_DB", "NHL")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+
+# 页面上展示的比赛字段，查询时只取这些字段
+MATCH_FIELDS = ["日期", "时间", "主队", "主队进球数", "客队", "客队进球数", "观众数量", "LOG", "备注"]
+MATCH_PROJECTION = {"_id": 0, **{field: 1 for field in MATCH_FIELDS}}
+MATCH_INDEX = [("主队", pymongo.ASCENDING), ("客队", pymongo.ASCENDING), ("日期", pymongo.ASCENDING)]
+
+_client = None
+_client_lock = threading.Lock()
+_indexed_collections = set()  # 本进程内已确认建好索引的赛季集合
+
+
+def get_mongo_client():
+    """获取进程级共享的 MongoDB 客户端（自带连接池，不要手动 close）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = pymongo.MongoClient(
+                    MONGO_HOST, maxPoolSize=MONGO_MAX_POOL_SIZE, serverSelectionTimeoutMS=5000
+                )
+    return _client
+
+
+def set_mongo_client(client):
+    """替换共享客户端（例如测试时换成 mongomock.MongoClient）"""
+    global _client
+    with _client_lock:
+        _client = client
+        _indexed_collections.clear()
+
+
+def get_match_db():
+    return get_mongo_client()[MONGO_DB]
+
+
+def ensure_match_indexes(seasons=None):
+    """
+    确保赛季集合上存在 (主队, 客队, 日期) 复合索引
+    :param seasons: 需要检查的赛季集合名，默认检查库中所有集合
+    每个集合在本进程内只检查一次；create_index 本身是幂等的
+    """
+    db = get_match_db()
+    if seasons is None:
+        seasons = db.list_collection_names()
+    for season in seasons:
+        if season in _indexed_collections:
+            continue
+        db[season].create_index(MATCH_INDEX, name="home_away_date")
+        _indexed_collections.add(season)
+
+
+def get_season_match_history(season, home_team, away_team):
+    """从 MongoDB 中检索某个赛季的历史对阵情况（按日期排序，只返回展示字段）"""
+    ensure_match_indexes([season])
+    cursor = get_match_db()[season].find(
+        {"主队": home_team, "客队": away_team},
+        MATCH_PROJECTION
+    ).sort("日期", pymongo.ASCENDING)
+    return list(cursor)
+
+
+def get_match_history(seasons, home_team, away_team):
+    """
+    一次查询检索多个赛季的历史对阵情况
+    使用 $unionWith 把各赛季集合的结果合并成一个聚合管道，每条记录附带 "赛季" 字段
+    """
+    seasons = list(seasons)
+    if not seasons:
+        return []
+    ensure_match_indexes(seasons)
+
+    def season_pipeline(season):
+        return [
+            {"$match": {"主队": home_team, "客队": away_team}},
+            {"$project": MATCH_PROJECTION},
+            {"$addFields": {"赛季": season}},
+        ]
+
+    pipeline = season_pipeline(seasons[0])
+    for season in seasons[1:]:
+        pipeline.append({"$unionWith": {"coll": season, "pipeline": season_pipeline(season)}})
+    pipeline.append({"$sort": {"赛季": 1, "日期": 1}})
+
+    try:
+        return list(get_match_db()[seasons[0]].aggregate(pipeline))
+    except (OperationFailure, NotImplementedError) as e:
+        # MongoDB 4.4 以下（或 mongomock）不支持 $unionWith，退回逐赛季查询
+        print(f"$unionWith 不可用，改为逐赛季查询: {e}")
+        match_history = []
+        for season in seasons:
+            for match in get_season_match_history(season, home_team, away_team):
+                match["赛季"] = season
+                match_history.append(match)
+        return match_history
+
+
+if __name__ == "__main__":
+    # 一次性初始化：为所有赛季集合建立索引
+    ensure_match_indexes()
+    print(f"已为 {MONGO_DB} 库中的 {len(_indexed_collections)} 个集合建立索引")
@@ -0,0 +1,192 @@
+import argparse
+import datetime
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from database import fetch_all
+from investments import LISTING_SOURCES
+from quotes import ASSET_CLASS_QUOTES, normalize_symbol
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", "price_history")  # 日收盘价文件目录
+PRICE_HISTORY_START = datetime.date.fromisoformat(os.getenv("PRICE_HISTORY_START", "2020-01-01"))  # 首次回填的起始日期
+
+_SCHEMA = pa.schema([pa.field("date", pa.date32()), pa.field("close", pa.float64())])
+
+
+class PriceHistoryStore:
+    """
+    按代码存放的日收盘价（列式存储）
+    每个 (资产类别, 代码) 一个 Parquet 文件：{root}/{资产类别}/{代码}.parquet，列为 date、close，按日期升序。
+    只追加上次之后缺少的日期；读取后的数组按文件修改时间缓存在内存中，多个会话共享。
+    """
+
+    def __init__(self, root=PRICE_HISTORY_DIR):
+        self.root = root
+        self._cache = {}  # {(资产类别, 代码): (文件修改时间, 日期数组, 收盘价数组)}
+        self._lock = threading.Lock()
+
+    def _path(self, asset_class, symbol):
+        return os.path.join(self.root, asset_class, symbol.replace(os.sep, "_") + ".parquet")
+
+    def load(self, asset_class, symbol):
+        """
+        读取一个代码的全部历史
+        :return: (datetime64[D] 日期数组, float64 收盘价数组)，没有历史时为两个空数组
+        """
+        path = self._path(asset_class, symbol)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64)
+        with self._lock:
+            cached = self._cache.get((asset_class, symbol))
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        table = pq.read_table(path)
+        dates = table["date"].to_numpy().astype("datetime64[D]")
+        closes = table["close"].to_numpy()
+        with self._lock:
+            self._cache[(asset_class, symbol)] = (mtime, dates, closes)
+        return dates, closes
+
+    def last_date(self, asset_class, symbol):
+        dates, _ = self.load(asset_class, symbol)
+        return dates[-1].astype(datetime.date) if len(dates) else None
+
+    def update(self, asset_class, symbol, until=None):
+        """
+        补齐一个代码到 until（默认昨天，即最近一个已收盘的日期）为止缺少的收盘价
+        :return: 新增的天数
+        """
+        until = until or datetime.date.today() - datetime.timedelta(days=1)
+        last = self.last_date(asset_class, symbol)
+        start = last + datetime.timedelta(days=1) if last else PRICE_HISTORY_START
+        if start > until:
+            return 0
+        closes = ASSET_CLASS_QUOTES[asset_class].provider.fetch_history(symbol, start, until)
+        if not closes:
+            return 0
+
+        days = sorted(closes)
+        new_rows = pa.table({"date": days, "close": [float(closes[day]) for day in days]}, schema=_SCHEMA)
+        path = self._path(asset_class, symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.concat_tables([pq.read_table(path), new_rows]) if last else new_rows
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        return len(days)
+
+    def fill(self, symbols_by_class, until=None):
+        """
+        为一批代码补齐历史，单个代码失败不影响其他代码
+        :param symbols_by_class: {资产类别: 代码的可迭代对象}
+        :return: {(资产类别, 代码): 新增的天数}
+        """
+        added = {}
+        for asset_class, symbols in symbols_by_class.items():
+            for symbol in sorted({normalize_symbol(symbol) for symbol in symbols if symbol}):
+                try:
+                    added[(asset_class, symbol)] = self.update(asset_class, symbol, until)
+                except Exception as e:
+                    print(f"无法补齐 {symbol} 的历史价格: {e}")
+        return added
+
+    def close_matrix(self, keys, dates):
+        """
+        把多个代码的收盘价对齐到同一组日期上
+        没有收盘价的日期（周末、节假日）沿用之前最近一个交易日的价格；第一条记录之前为 NaN。
+        :param keys: (资产类别, 代码) 列表
+        :param dates: datetime64[D] 日期数组
+        :return: 形状为 (日期数, 代码数) 的 float64 数组
+        """
+        matrix = np.full((len(dates), len(keys)), np.nan)
+        for column, (asset_class, symbol) in enumerate(keys):
+            history_dates, closes = self.load(asset_class, symbol)
+            if not len(history_dates):
+                continue
+            positions = np.searchsorted(history_dates, dates, side="right") - 1
+            known = positions >= 0
+            matrix[known, column] = closes[positions[known]]
+        return matrix
+
+
+price_history = PriceHistoryStore()
+
+
+def _load_lots(user_ids, end_date):
+    branches = []
+    params = []
+    for asset_class in ASSET_CLASS_QUOTES:
+        table = LISTING_SOURCES[asset_class][0]
+        branches.append(f"""
+            SELECT user_id, '{asset_class}' AS asset_class, UPPER(TRIM(sub_type)) AS symbol,
+                   investment_date, quantity, buy_price * quantity AS cost
+            FROM {table}
+            WHERE user_id = ANY(%s) AND investment_date <= %s
+        """)
+        params += [list(user_ids), end_date]
+    return fetch_all(" UNION ALL ".join(branches), params)
+
+
+def portfolio_history(user_ids, start_date, end_date, store=None):
+    """
+    计算用户持仓在一段日期内每天的市值和累计成本
+    所有持仓按 (用户, 日期, 代码) 展开成数组：买入数量在买入日累加，按日期累积求和后乘以对齐的收盘价矩阵，
+    一次向量化计算得到全部用户、全部日期的结果。只读取本地历史，不访问行情接口。
+    没有历史价格的代码当天按 0 计入市值。
+    :return: pandas.DataFrame，列为 user_id、date、value、cost（float64，用于图表展示）
+    """
+    store = store or price_history
+    user_ids = list(user_ids)
+    dates = np.arange(np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1)
+    columns = ["user_id", "date", "value", "cost"]
+    lots = _load_lots(user_ids, end_date) if user_ids and len(dates) else []
+    if not lots:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame(lots)
+    user_codes, users = pd.factorize(frame["user_id"])
+    key_codes, keys = pd.MultiIndex.from_frame(frame[["asset_class", "symbol"]]).factorize()
+    # 起始日期之前买入的持仓从第一天起计入
+    day_index = np.clip(
+        (frame["investment_date"].to_numpy().astype("datetime64[D]") - dates[0]).astype(np.int64), 0, None
+    )
+    quantity = frame["quantity"].astype(np.float64).to_numpy()
+    cost = frame["cost"].astype(np.float64).to_numpy()
+
+    held = np.zeros((len(users), len(dates), len(keys)))
+    np.add.at(held, (user_codes, day_index, key_codes), quantity)
+    held = np.cumsum(held, axis=1)
+    invested = np.zeros((len(users), len(dates)))
+    np.add.at(invested, (user_codes, day_index), cost)
+    invested = np.cumsum(invested, axis=1)
+
+    closes = np.nan_to_num(store.close_matrix(list(keys), dates))
+    value = np.einsum("udk,dk->ud", held, closes)
+
+    return pd.DataFrame({
+        "user_id": np.repeat(np.asarray(users), len(dates)),
+        "date": np.tile(dates, len(users)),
+        "value": value.ravel(),
+        "cost": invested.ravel(),
+    })
+
+
+if __name__ == "__main__":
+    # 一次性回填或补齐所有持仓代码的历史收盘价: python price_history.py [--until 2024-12-31]
+    from price_refresher import collect_symbols
+
+    parser = argparse.ArgumentParser(description="补齐持仓代码的日收盘价历史")
+    parser.add_argument("--until", type=datetime.date.fromisoformat, default=None)
+    args = parser.parse_args()
+    result = price_history.fill(collect_symbols(), args.until)
+    for (asset_class, symbol), days in sorted(result.items()):
+        print(f"{asset_class} {symbol}: 新增 {days} 天")
@@ -0,0 +1,99 @@
+import argparse
+import os
+import time
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from database import fetch_all, get_connection
+from quotes import get_all_quotes
+from price_history import price_history
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+PRICE_REFRESH_INTERVAL = float(os.getenv("PRICE_REFRESH_INTERVAL", "30"))  # 两次刷新之间的秒数
+PRICE_HISTORY_INTERVAL = float(os.getenv("PRICE_HISTORY_INTERVAL", "21600"))  # 补齐历史收盘价的间隔秒数
+
+# 资产类别 -> 持仓表
+HOLDING_TABLES = {
+    "crypto": "crypto_investments",
+    "stock": "stock_investments",
+}
+
+
+def collect_symbols():
+    """汇总所有用户持有的代码，返回 {资产类别: {代码}}"""
+    query = " UNION ".join(
+        f"SELECT DISTINCT '{asset_class}' AS asset_class, UPPER(TRIM(sub_type)) AS symbol FROM {table} "
+        f"WHERE sub_type IS NOT NULL AND TRIM(sub_type) <> ''"
+        for asset_class, table in HOLDING_TABLES.items()
+    )
+    symbols_by_class = {}
+    for row in fetch_all(query):
+        symbols_by_class.setdefault(row["asset_class"], set()).add(row["symbol"])
+    return symbols_by_class
+
+
+def refresh_prices():
+    """
+    实时获取所有持仓代码的价格并写入 latest_prices 表
+    不读进程内的报价缓存，fetched_at 记录的是价格真正从行情接口取到的时间；
+    取不到价格的代码保留原来的记录（fetched_at 不变），由读取方按 LOCAL_PRICE_MAX_AGE 判断是否过期
+    :return: (写入的价格数, {(资产类别, 代码): 缺失原因})
+    """
+    symbols_by_class = collect_symbols()
+    if not symbols_by_class:
+        return 0, {}
+    batch = get_all_quotes(symbols_by_class, source="live", use_cache=False)
+    rows = [
+        (asset_class, symbol, price, batch.fetched_at[(asset_class, symbol)])
+        for (asset_class, symbol), price in batch.prices.items()
+        if price is not None
+    ]
+    if rows:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO latest_prices (asset_class, symbol, price, fetched_at)
+                    VALUES %s
+                    ON CONFLICT (asset_class, symbol) DO UPDATE SET
+                        price = EXCLUDED.price,
+                        fetched_at = EXCLUDED.fetched_at
+                    WHERE latest_prices.fetched_at < EXCLUDED.fetched_at
+                """, rows)
+            conn.commit()
+    return len(rows), batch.missing
+
+
+def run_forever(interval=PRICE_REFRESH_INTERVAL, history_interval=PRICE_HISTORY_INTERVAL):
+    """按固定间隔循环刷新；单次失败只打印错误，下一轮继续。历史收盘价按 history_interval 补齐"""
+    history_filled_at = None
+    while True:
+        started = time.monotonic()
+        try:
+            updated, missing = refresh_prices()
+            print(f"已刷新 {updated} 个价格" + (f"，{len(missing)} 个代码取价失败" if missing else ""))
+        except Exception as e:
+            print(f"刷新价格失败: {e}")
+        if history_filled_at is None or started - history_filled_at >= history_interval:
+            try:
+                added = price_history.fill(collect_symbols())
+                print(f"已补齐 {sum(added.values())} 条历史收盘价")
+            except Exception as e:
+                print(f"补齐历史收盘价失败: {e}")
+            history_filled_at = started
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    # 与页面分开、单独常驻运行: python price_refresher.py [--once] [--interval 30]
+    parser = argparse.ArgumentParser(description="定时把持仓代码的最新价格写入 latest_prices 表")
+    parser.add_argument("--once", action="store_true", help="只刷新一次后退出")
+    parser.add_argument("--interval", type=float, default=PRICE_REFRESH_INTERVAL)
+    args = parser.parse_args()
+    if args.once:
+        updated, missing = refresh_prices()
+        print(f"已刷新 {updated} 个价格")
+        for (asset_class, symbol), reason in sorted(missing.items()):
+            print(f"{asset_class} {symbol}: {reason}")
+    else:
+        run_forever(args.interval)
@@ -0,0 +1,572 @@
+import asyncio
+import datetime
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import ccxt
+import ccxt.async_support as ccxt_async
+import pandas as pd
+import yfinance as yf
+from dotenv import load_dotenv
+from database import fetch_all
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+CRYPTO_QUOTE_TTL = float(os.getenv("CRYPTO_QUOTE_TTL", "30"))  # 虚拟币报价缓存秒数
+CRYPTO_QUOTE_MAX_STALE = float(os.getenv("CRYPTO_QUOTE_MAX_STALE", "0"))  # 过期后仍可先返回旧价格的秒数
+STOCK_QUOTE_TTL = float(os.getenv("STOCK_QUOTE_TTL", "300"))  # 股票收盘价缓存秒数
+STOCK_QUOTE_MAX_STALE = float(os.getenv("STOCK_QUOTE_MAX_STALE", "3600"))
+QUOTE_REQUEST_TIMEOUT = float(os.getenv("QUOTE_REQUEST_TIMEOUT", "5"))  # 单个代码取价的超时秒数
+QUOTE_DEADLINE = float(os.getenv("QUOTE_DEADLINE", "8"))  # 一次批量取价的总时限，超时的代码标记为缺失
+QUOTE_FETCH_WORKERS = int(os.getenv("QUOTE_FETCH_WORKERS", "8"))  # 执行阻塞式取价（yfinance）的线程数
+QUOTE_NOT_FOUND_TTL = float(os.getenv("QUOTE_NOT_FOUND_TTL", "300"))  # 行情接口查不到的代码在该秒数内不再请求
+QUOTE_FAILURE_BACKOFF = float(os.getenv("QUOTE_FAILURE_BACKOFF", "30"))  # 超时或出错的代码在该秒数内不再请求
+# 价格来源：local 只读 price_refresher.py 写入的 latest_prices 表；live 直接访问行情接口；
+# auto 先读本地价格，本地没有或已过期的代码再实时获取
+PRICE_SOURCE = os.getenv("PRICE_SOURCE", "auto")
+LOCAL_PRICE_MAX_AGE = float(os.getenv("LOCAL_PRICE_MAX_AGE", "600"))  # 本地价格超过该秒数视为过期
+
+
+def normalize_symbol(symbol):
+    """统一代码格式（去空白、转大写），保证缓存键一致"""
+    return symbol.strip().upper()
+
+
+class QuoteProvider(ABC):
+    """
+    行情数据源接口
+    子类实现 fetch(symbols)：一次请求拿回一批代码的最新价格，返回 {代码: 价格}，拿不到价格的代码直接省略；
+    以及 fetch_history(symbol, start, end)：取单个代码的日收盘价。
+    """
+
+    @abstractmethod
+    def fetch(self, symbols):
+        """批量取最新价格，返回 {代码: 价格}"""
+
+    def fetch_one(self, symbol):
+        """取单个代码的价格，拿不到时返回 None"""
+        return self.fetch([symbol]).get(symbol)
+
+    async def fetch_async(self, symbols):
+        """异步批量取价；默认把阻塞的 fetch 放到线程池中执行"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch, symbols)
+
+    async def fetch_one_async(self, symbol):
+        """异步取单个代码的价格；默认把阻塞的 fetch_one 放到线程池中执行"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch_one, symbol)
+
+    @abstractmethod
+    def fetch_history(self, symbol, start, end):
+        """
+        取单个代码在 [start, end] 内的日收盘价
+        :return: {datetime.date: 收盘价}，没有数据的日期直接省略
+        """
+
+
+class BinanceProvider(QuoteProvider):
+    """币安现货行情（以 USDT 计价），通过 fetch_tickers 一次取回所有代码"""
+
+    def __init__(self, quote="USDT", exchange=None):
+        self.quote = quote
+        self._exchange = exchange
+        self._async_exchange = None  # 只在 _runner 的事件循环中创建和使用
+        self._lock = threading.Lock()
+
+    @property
+    def exchange(self):
+        # 交易所对象和市场列表只加载一次，之后在所有会话间复用
+        with self._lock:
+            if self._exchange is None:
+                self._exchange = ccxt.binance({"enableRateLimit": True})
+            if not self._exchange.markets:
+                self._exchange.load_markets()
+        return self._exchange
+
+    def fetch(self, symbols):
+        exchange = self.exchange
+        pairs = {f"{symbol}/{self.quote}": symbol for symbol in symbols}
+        # 不存在的交易对会让整个 fetch_tickers 报错，先过滤掉
+        known_pairs = [pair for pair in pairs if pair in exchange.markets]
+        unknown = [pairs[pair] for pair in pairs if pair not in exchange.markets]
+        if unknown:
+            print(f"币安不存在以下交易对: {', '.join(unknown)}")
+        if not known_pairs:
+            return {}
+        tickers = exchange.fetch_tickers(known_pairs)
+        return {
+            pairs[pair]: ticker["last"]
+            for pair, ticker in tickers.items()
+            if pair in pairs and ticker.get("last") is not None
+        }
+
+    async def _get_async_exchange(self):
+        # 使用 ccxt 的异步客户端，多个请求可以同时进行
+        if self._async_exchange is None:
+            self._async_exchange = ccxt_async.binance({"enableRateLimit": True})
+        if not self._async_exchange.markets:
+            await self._async_exchange.load_markets()
+        return self._async_exchange
+
+    async def fetch_async(self, symbols):
+        exchange = await self._get_async_exchange()
+        pairs = {f"{symbol}/{self.quote}": symbol for symbol in symbols}
+        known_pairs = [pair for pair in pairs if pair in exchange.markets]
+        if not known_pairs:
+            return {}
+        tickers = await exchange.fetch_tickers(known_pairs)
+        return {
+            pairs[pair]: ticker["last"]
+            for pair, ticker in tickers.items()
+            if pair in pairs and ticker.get("last") is not None
+        }
+
+    async def fetch_one_async(self, symbol):
+        exchange = await self._get_async_exchange()
+        pair = f"{symbol}/{self.quote}"
+        if pair not in exchange.markets:
+            return None
+        ticker = await exchange.fetch_ticker(pair)
+        return ticker.get("last")
+
+    def fetch_history(self, symbol, start, end):
+        exchange = self.exchange
+        pair = f"{symbol}/{self.quote}"
+        if pair not in exchange.markets:
+            return {}
+        since = int(datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc).timestamp() * 1000)
+        closes = {}
+        while True:
+            # 每次最多返回 1000 根日线，按时间向后翻页
+            candles = exchange.fetch_ohlcv(pair, "1d", since=since, limit=1000)
+            for timestamp, _, _, _, close, _ in candles:
+                day = datetime.datetime.fromtimestamp(timestamp / 1000, datetime.timezone.utc).date()
+                if start <= day <= end:
+                    closes[day] = close
+            if not candles or len(candles) < 1000 or day >= end:
+                return closes
+            since = candles[-1][0] + 1
+
+
+class YFinanceProvider(QuoteProvider):
+    """雅虎财经股票收盘价，通过 yf.download 一次请求取回所有代码"""
+
+    def __init__(self, period="5d"):
+        # 取最近几天而不是 1 天，周末和节假日也能拿到最后一个交易日的收盘价
+        self.period = period
+        self._download_lock = threading.Lock()
+
+    def fetch(self, symbols):
+        symbols = list(symbols)
+        # yf.download 共享全局状态，同一时刻只能有一个线程调用
+        with self._download_lock:
+            data = yf.download(
+                symbols, period=self.period, interval="1d", auto_adjust=True,
+                progress=False, threads=True
+            )
+        if data is None or data.empty:
+            return {}
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=symbols[0])
+        prices = {}
+        for symbol in symbols:
+            if symbol not in closes.columns:
+                continue
+            series = closes[symbol].dropna()
+            if not series.empty:
+                prices[symbol] = float(series.iloc[-1])  # 最近一个交易日的收盘价
+        return prices
+
+    def fetch_one(self, symbol):
+        # yf.download 共享全局状态，不能在多个线程中同时调用；单个代码改用 Ticker.history
+        history = yf.Ticker(symbol).history(period=self.period)
+        closes = history["Close"].dropna() if not history.empty else history
+        return float(closes.iloc[-1]) if len(closes) else None
+
+    def fetch_history(self, symbol, start, end):
+        history = yf.Ticker(symbol).history(
+            start=start, end=end + datetime.timedelta(days=1), interval="1d", auto_adjust=True
+        )
+        if history.empty:
+            return {}
+        closes = history["Close"].dropna()
+        return {timestamp.date(): float(close) for timestamp, close in closes.items()}
+
+
+class FakeExchangeProvider(QuoteProvider):
+    """
+    离线测试用的本地假行情源（虚拟币和股票通用）：价格来自传入的字典，并记录每次批量请求
+    delays 可为部分代码设置响应延迟（秒），用于模拟慢请求和超时
+    history 可为部分代码提供 {日期: 收盘价}；未提供的代码每天的收盘价都等于当前价格
+    """
+
+    def __init__(self, prices=None, delays=None, history=None):
+        self.prices = {normalize_symbol(symbol): price for symbol, price in (prices or {}).items()}
+        self.delays = {normalize_symbol(symbol): delay for symbol, delay in (delays or {}).items()}
+        self.history = {normalize_symbol(symbol): closes for symbol, closes in (history or {}).items()}
+        self.calls = []
+
+    def fetch(self, symbols):
+        self.calls.append(sorted(symbols))
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+    async def fetch_async(self, symbols):
+        # 批量请求要等最慢的代码返回
+        self.calls.append(sorted(symbols))
+        await asyncio.sleep(max((self.delays.get(symbol, 0) for symbol in symbols), default=0))
+        return {symbol: self.prices[symbol] for symbol in symbols if symbol in self.prices}
+
+    async def fetch_one_async(self, symbol):
+        self.calls.append([symbol])
+        await asyncio.sleep(self.delays.get(symbol, 0))
+        return self.prices.get(symbol)
+
+    def fetch_history(self, symbol, start, end):
+        self.calls.append([symbol, start, end])
+        if symbol in self.history:
+            return {day: close for day, close in self.history[symbol].items() if start <= day <= end}
+        if symbol not in self.prices:
+            return {}
+        return {
+            start + datetime.timedelta(days=i): self.prices[symbol]
+            for i in range((end - start).days + 1)
+        }
+
+
+class QuoteService:
+    """
+    带 TTL 缓存的批量报价服务
+    传入一组代码，去重后只对缓存未命中的部分发起一次批量请求；
+    缓存在进程内共享，所有 Streamlit 会话都能命中。
+    设置 max_stale 后，过期不超过 max_stale 秒的价格会先直接返回，同时在后台线程刷新。
+    """
+
+    def __init__(self, provider, ttl, max_stale=0, not_found_ttl=QUOTE_NOT_FOUND_TTL,
+                 failure_backoff=QUOTE_FAILURE_BACKOFF):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.not_found_ttl = not_found_ttl
+        self.failure_backoff = failure_backoff
+        self._cache = {}  # {代码: (价格, 获取时间)}
+        self._failures = {}  # {代码: (缺失原因, 失败时间)}
+        self._refreshing = set()  # 正在后台刷新的代码
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # 同一时刻只有一个线程去请求行情，其余线程等待后直接读缓存
+
+    def _lookup(self, symbols, now):
+        """从缓存中取价格，返回 (新鲜的, 已过期但仍可使用的)"""
+        fresh, stale = {}, {}
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in self._cache:
+                    continue
+                price, fetched_at = self._cache[symbol]
+                age = now - fetched_at
+                if age < self.ttl:
+                    fresh[symbol] = price
+                elif age < self.ttl + self.max_stale:
+                    stale[symbol] = price
+        return fresh, stale
+
+    def get_quotes(self, symbols):
+        """
+        批量获取价格
+        :param symbols: 代码的可迭代对象，可以有重复
+        :return: {代码: 价格}，获取失败的代码对应 None
+        """
+        wanted = {normalize_symbol(symbol) for symbol in symbols if symbol}
+        quotes, stale = self._lookup(wanted, time.monotonic())
+        if stale:
+            quotes.update(stale)
+            self._refresh_in_background(stale)
+        missing = wanted - quotes.keys()
+        if missing:
+            with self._fetch_lock:
+                # 等锁期间其他线程可能已经拿到了这些价格
+                fresh, _ = self._lookup(missing, time.monotonic())
+                quotes.update(fresh)
+                missing -= quotes.keys()
+                if missing:
+                    quotes.update(self._refresh(missing))
+        return {symbol: quotes.get(symbol) for symbol in wanted}
+
+    def get_quote(self, symbol):
+        """获取单个代码的价格，失败时返回 None"""
+        if not symbol:
+            return None
+        return self.get_quotes([symbol]).get(normalize_symbol(symbol))
+
+    def _refresh(self, symbols):
+        try:
+            fetched = self.provider.fetch(sorted(symbols))
+        except Exception as e:
+            print(f"无法获取 {', '.join(sorted(symbols))} 的实时价格: {e}")
+            return {}
+        return self.store(fetched)
+
+    def store(self, prices):
+        """把外部取到的价格写入缓存，返回 {代码: float 价格}"""
+        now = time.monotonic()
+        prices = {symbol: float(price) for symbol, price in prices.items() if price is not None}
+        with self._lock:
+            for symbol, price in prices.items():
+                self._cache[symbol] = (price, now)
+                self._failures.pop(symbol, None)
+        return prices
+
+    def mark_failed(self, symbols, reason):
+        """
+        记录取价失败的代码：查不到（not_found）的 not_found_ttl 秒内不再请求，
+        超时或出错的 failure_backoff 秒内不再请求，避免一个卡住的代码拖慢之后每次页面刷新
+        """
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                self._failures[symbol] = (reason, now)
+
+    def known_failures(self, symbols, now):
+        """返回仍在退避期内的代码：{代码: 上次的缺失原因}"""
+        failures = {}
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in self._failures:
+                    continue
+                reason, failed_at = self._failures[symbol]
+                backoff = self.not_found_ttl if reason == "not_found" else self.failure_backoff
+                if now - failed_at < backoff:
+                    failures[symbol] = reason
+        return failures
+
+    def _refresh_in_background(self, symbols):
+        with self._lock:
+            symbols = set(symbols) - self._refreshing
+            self._refreshing |= symbols
+        if not symbols:
+            return
+
+        def run():
+            try:
+                self._refresh(symbols)
+            finally:
+                with self._lock:
+                    self._refreshing -= symbols
+
+        threading.Thread(target=run, name="quote-refresh", daemon=True).start()
+
+    def set_provider(self, provider):
+        """替换数据源（例如测试时换成 FakeExchangeProvider），同时清空缓存"""
+        self.provider = provider
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._failures.clear()
+
+
+# 进程级共享的报价服务
+crypto_quotes = QuoteService(BinanceProvider(), ttl=CRYPTO_QUOTE_TTL, max_stale=CRYPTO_QUOTE_MAX_STALE)
+stock_quotes = QuoteService(YFinanceProvider(), ttl=STOCK_QUOTE_TTL, max_stale=STOCK_QUOTE_MAX_STALE)
+
+# 持仓资产类别 -> 报价服务
+ASSET_CLASS_QUOTES = {
+    "crypto": crypto_quotes,
+    "stock": stock_quotes,
+}
+
+
+class _AsyncRunner:
+    """
+    后台线程中常驻的事件循环
+    Streamlit 脚本线程把协程提交到这里执行，ccxt 异步客户端等对象可以跨请求复用。
+    """
+
+    def __init__(self, workers=QUOTE_FETCH_WORKERS):
+        self.workers = workers
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="quote-fetch"))
+                threading.Thread(target=loop.run_forever, name="quote-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def run(self, coro, timeout):
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result(timeout)
+
+
+_runner = _AsyncRunner()
+
+
+class QuoteBatch:
+    """
+    一次批量取价的结果
+    prices: {(资产类别, 代码): 价格或 None}
+    missing: {(资产类别, 代码): 缺失原因}，原因为 timeout、deadline、not_found、error 或 not_refreshed
+    fetched_at: {(资产类别, 代码): 从行情接口取到价格的时间（UTC）}，只包含本次实时取到的价格
+    """
+
+    def __init__(self, prices, missing, fetched_at=None):
+        self.prices = prices
+        self.missing = missing
+        self.fetched_at = fetched_at or {}
+
+    def get(self, asset_class, symbol):
+        return self.prices.get((asset_class, symbol))
+
+    @property
+    def complete(self):
+        return not self.missing
+
+
+async def _fetch_concurrently(keys, request_timeout, deadline):
+    """
+    每个资产类别发起一次批量请求（有 request_timeout 超时），各类别同时进行；
+    批量请求没有返回价格的代码（超时、报错或结果中缺少）再逐个并发请求，每个同样有 request_timeout 超时。
+    整体不超过 deadline 秒，到时仍未完成的代码标记为 deadline。
+    :return: {(资产类别, 代码): (价格或 None, 缺失原因或 None, 取到价格的时间或 None)}
+    """
+    results = {}
+
+    def record(asset_class, symbol, price, reason):
+        at = datetime.datetime.now(datetime.timezone.utc) if price is not None else None
+        results[(asset_class, symbol)] = (price, reason, at)
+
+    async def fetch_one(provider, asset_class, symbol):
+        try:
+            price = await asyncio.wait_for(provider.fetch_one_async(symbol), request_timeout)
+        except asyncio.TimeoutError:
+            return record(asset_class, symbol, None, "timeout")
+        except Exception as e:
+            print(f"无法获取 {symbol} 的实时价格: {e}")
+            return record(asset_class, symbol, None, "error")
+        record(asset_class, symbol, price, None if price is not None else "not_found")
+
+    async def fetch_class(asset_class, symbols):
+        provider = ASSET_CLASS_QUOTES[asset_class].provider
+        try:
+            prices = await asyncio.wait_for(provider.fetch_async(sorted(symbols)), request_timeout)
+        except asyncio.TimeoutError:
+            prices = {}
+        except Exception as e:
+            print(f"无法批量获取 {', '.join(sorted(symbols))} 的实时价格: {e}")
+            prices = {}
+        for symbol, price in prices.items():
+            if symbol in symbols and price is not None:
+                record(asset_class, symbol, price, None)
+        leftovers = [symbol for symbol in sorted(symbols) if (asset_class, symbol) not in results]
+        await asyncio.gather(*(fetch_one(provider, asset_class, symbol) for symbol in leftovers))
+
+    symbols_by_class = {}
+    for asset_class, symbol in keys:
+        symbols_by_class.setdefault(asset_class, set()).add(symbol)
+    tasks = [asyncio.ensure_future(fetch_class(*item)) for item in symbols_by_class.items()]
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    for key in keys:
+        results.setdefault(key, (None, "deadline", None))
+    return results
+
+
+def get_local_prices(keys, max_age=LOCAL_PRICE_MAX_AGE):
+    """
+    从 latest_prices 表读取未过期的价格
+    :param keys: (资产类别, 代码) 的可迭代对象
+    :return: {(资产类别, 代码): 价格}，没有或已过期的代码直接省略
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = fetch_all("""
+        SELECT asset_class, symbol, price
+        FROM latest_prices
+        WHERE asset_class = ANY(%s) AND symbol = ANY(%s)
+          AND fetched_at > now() - make_interval(secs => %s)
+    """, (sorted({k[0] for k in keys}), sorted({k[1] for k in keys}), max_age))
+    prices = {}
+    for row in rows:
+        key = (row["asset_class"], row["symbol"])
+        if key in keys:
+            prices[key] = float(row["price"])
+    return prices
+
+
+def get_all_quotes(symbols_by_class, request_timeout=QUOTE_REQUEST_TIMEOUT, deadline=QUOTE_DEADLINE, source=None,
+                   use_cache=True):
+    """
+    并发获取多个资产类别的价格
+    先读各报价服务的缓存，未命中的代码按资产类别各发起一次批量请求，各类别同时进行
+    （虚拟币用 ccxt 异步客户端，股票在线程池中调用 yfinance），批量请求没有返回的代码再逐个请求；
+    每个请求有独立超时，整体不超过 deadline 秒；超时或失败的代码在结果中标记为缺失，不会阻塞页面。
+    行情接口查不到的代码在 QUOTE_NOT_FOUND_TTL 秒内、超时或出错的代码在 QUOTE_FAILURE_BACKOFF 秒内
+    直接按上次的原因标记为缺失，不再重复请求。
+    :param symbols_by_class: {资产类别: 代码的可迭代对象}
+    :param source: 价格来源（local、live、auto），默认取 PRICE_SOURCE；
+                   local 模式下本地没有的代码标记为缺失（原因 not_refreshed），不会访问网络
+    :param use_cache: False 时不读报价服务的缓存，所有代码都实时获取（price_refresher 使用，保证写入的时间准确）
+    :return: QuoteBatch
+    """
+    source = source or PRICE_SOURCE
+    wanted_by_class = {
+        asset_class: {normalize_symbol(symbol) for symbol in symbols if symbol}
+        for asset_class, symbols in symbols_by_class.items()
+    }
+
+    prices = {}
+    if source != "live":
+        keys = [(asset_class, symbol) for asset_class, wanted in wanted_by_class.items() for symbol in wanted]
+        try:
+            prices = get_local_prices(keys)
+        except Exception as e:
+            print(f"无法读取本地价格: {e}")
+        if source == "local":
+            missing = {key: "not_refreshed" for key in keys if key not in prices}
+            prices.update({key: None for key in missing})
+            return QuoteBatch(prices, missing)
+
+    to_fetch = []
+    missing = {}
+    fetched_at = {}
+    now = time.monotonic()
+    for asset_class, wanted in wanted_by_class.items():
+        service = ASSET_CLASS_QUOTES[asset_class]
+        wanted = {symbol for symbol in wanted if (asset_class, symbol) not in prices}
+        if not wanted:
+            continue
+        fresh, stale = service._lookup(wanted, now) if use_cache else ({}, {})
+        if stale:
+            service._refresh_in_background(stale)
+        for symbol, price in {**fresh, **stale}.items():
+            prices[(asset_class, symbol)] = price
+        failures = service.known_failures(wanted - fresh.keys() - stale.keys(), now)
+        for symbol, reason in failures.items():
+            prices[(asset_class, symbol)] = None
+            missing[(asset_class, symbol)] = reason
+        to_fetch += [
+            (asset_class, symbol) for symbol in sorted(wanted - fresh.keys() - stale.keys() - failures.keys())
+        ]
+
+    if to_fetch:
+        try:
+            results = _runner.run(_fetch_concurrently(to_fetch, request_timeout, deadline), timeout=deadline + 1)
+        except Exception as e:
+            print(f"批量取价失败: {e}")
+            results = {key: (None, "deadline", None) for key in to_fetch}
+        for (asset_class, symbol), (price, reason, at) in results.items():
+            if price is not None:
+                prices[(asset_class, symbol)] = ASSET_CLASS_QUOTES[asset_class].store({symbol: price})[symbol]
+                fetched_at[(asset_class, symbol)] = at
+            else:
+                prices[(asset_class, symbol)] = None
+                missing[(asset_class, symbol)] = reason
+                ASSET_CLASS_QUOTES[asset_class].mark_failed([symbol], reason)
+    return QuoteBatch(prices, missing, fetched_at)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from database import fetch_one, fetch_all, on_table_change
+
+TEAM_INDEX_CHECK_INTERVAL = float(os.getenv("TEAM_INDEX_CHECK_INTERVAL", "60"))  # 检查 teams 表是否变化的最小间隔秒数
+TEAM_SEARCH_LIMIT = int(os.getenv("TEAM_SEARCH_LIMIT", "20"))  # 服务端检索最多返回的球队数
+
+
+class TeamSearchIndex:
+    """
+    球队名称检索索引（英文名 + 中文名）
+    为每个名称建立单字和二元组倒排表：查询时先用倒排表求交集缩小候选集，
+    再做子串校验和排序，避免对所有球队做线性扫描。
+    """
+
+    def __init__(self, teams):
+        self.teams = list(teams)
+        self._names = [
+            (team["english_name"].lower(), team["chinese_name"] or "")
+            for team in self.teams
+        ]
+        self._postings = {}  # {单字或二元组: {球队下标}}
+        for i, names in enumerate(self._names):
+            for name in names:
+                for gram in self._grams(name):
+                    self._postings.setdefault(gram, set()).add(i)
+
+    @staticmethod
+    def _grams(text):
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def _candidates(self, query):
+        if len(query) == 1:
+            return self._postings.get(query, set())
+        bigrams = sorted(
+            (self._postings.get(query[i:i + 2], set()) for i in range(len(query) - 1)),
+            key=len
+        )
+        return set.intersection(*bigrams)
+
+    @staticmethod
+    def _rank(query, name):
+        """匹配程度：0 完全相同，1 前缀，2 单词前缀，3 其他子串；None 表示不匹配"""
+        position = name.find(query)
+        if position < 0:
+            return None
+        if name == query:
+            return (0, 0)
+        if position == 0:
+            return (1, len(name))
+        if name[position - 1] in " -.'":
+            return (2, position)
+        return (3, position)
+
+    def search(self, query, limit=None):
+        """
+        按英文名（不区分大小写）或中文名检索球队
+        :param query: 名称的任意片段，空字符串返回全部球队
+        :param limit: 最多返回的条数
+        :return: 按匹配程度排序、按英文名去重后的球队列表
+        """
+        query = (query or "").strip().lower()
+        if not query:
+            ranked = sorted(range(len(self.teams)), key=lambda i: self._names[i][0])
+        else:
+            scored = []
+            for i in self._candidates(query):
+                ranks = [r for r in (self._rank(query, name) for name in self._names[i]) if r is not None]
+                if ranks:
+                    scored.append((min(ranks), self._names[i][0], i))
+            ranked = [i for _, _, i in sorted(scored)]
+
+        results = []
+        seen = set()
+        for i in ranked:
+            team = self.teams[i]
+            if team["english_name"] in seen:
+                continue
+            seen.add(team["english_name"])
+            results.append(team)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_index_fingerprint = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _teams_fingerprint():
+    """teams 表内容的指纹，表有增删改时会变化"""
+    row = fetch_one("""
+        SELECT COUNT(*) AS n,
+               md5(string_agg(id::text || ':' || english_name || ':' || COALESCE(chinese_name, ''), ',' ORDER BY id)) AS digest
+        FROM teams
+    """)
+    return (row["n"], row["digest"])
+
+
+def get_team_index():
+    """
+    获取进程级共享的球队检索索引
+    索引只在首次使用或 teams 表发生变化时重建，变化检查最多每 TEAM_INDEX_CHECK_INTERVAL 秒一次
+    """
+    global _index, _index_fingerprint, _index_checked_at
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < TEAM_INDEX_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        if _index is not None and time.monotonic() - _index_checked_at < TEAM_INDEX_CHECK_INTERVAL:
+            return _index
+        fingerprint = _teams_fingerprint()
+        if _index is None or fingerprint != _index_fingerprint:
+            teams = fetch_all("SELECT id, english_name, chinese_name FROM teams ORDER BY id")
+            _index = TeamSearchIndex(teams)
+            _index_fingerprint = fingerprint
+        _index_checked_at = time.monotonic()
+        return _index
+
+
+def invalidate_team_index():
+    """让下一次检索强制检查 teams 表并按需重建索引"""
+    global _index_checked_at
+    with _index_lock:
+        _index_checked_at = 0.0
+
+
+# 通过 execute_query 写入 teams 表后立即重新检查索引
+on_table_change("teams", invalidate_team_index)
+
+
+def search_teams(query, limit=None):
+    """检索球队，返回包含 id、english_name、chinese_name 的字典列表"""
+    return get_team_index().search(query, limit)
+
+
+_trigram_available = None
+
+
+def _has_trigram():
+    """数据库中是否安装了 pg_trgm 扩展（见 migrations/005_team_trigram_search.sql），结果在进程内缓存"""
+    global _trigram_available
+    if _trigram_available is None:
+        try:
+            _trigram_available = fetch_one("SELECT 1 AS ok FROM pg_extension WHERE extname = 'pg_trgm'") is not None
+        except Exception as e:
+            print(f"无法检查 pg_trgm 扩展: {e}")
+            return False
+    return _trigram_available
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_teams_db(query, limit=TEAM_SEARCH_LIMIT):
+    """
+    在数据库中检索球队，只返回排名前 limit 的结果
+    子串匹配走 pg_trgm GIN 索引，排序规则与 TeamSearchIndex 一致（完全相同、前缀、单词前缀、其他子串），
+    同一档内按三元组相似度排序；按英文名（不区分大小写）去重。结果按 teams 表打标签缓存，表被写入后失效。
+    没有安装 pg_trgm 时退回进程内索引。
+    """
+    query = (query or "").strip().lower()
+    if not _has_trigram():
+        return search_teams(query, limit)
+    if not query:
+        return fetch_all("""
+            SELECT DISTINCT ON (lower(english_name)) id, english_name, chinese_name
+            FROM teams
+            ORDER BY lower(english_name), id
+            LIMIT %s
+        """, (limit,), cache_tables=("teams",))
+
+    # 单词前缀：第一次出现的位置前面是分隔符（与 TeamSearchIndex._rank 相同）；
+    # 用 position() 和 LIKE 做纯文本匹配，查询中的任何标点都不会被当作正则或通配符
+    pattern = _escape_like(query)
+    return fetch_all("""
+        SELECT id, english_name, chinese_name
+        FROM (
+            SELECT DISTINCT ON (lower(english_name)) id, english_name, chinese_name, rank, score
+            FROM (
+                SELECT id, english_name, chinese_name,
+                       CASE
+                           WHEN lower(english_name) = %(q)s OR chinese_name = %(q)s THEN 0
+                           WHEN lower(english_name) LIKE %(p)s || '%%' OR chinese_name LIKE %(p)s || '%%' THEN 1
+                           WHEN substr(lower(english_name), position(%(q)s IN lower(english_name)) - 1, 1)
+                                    IN (' ', '-', '.', '''')
+                             OR substr(COALESCE(chinese_name, ''), position(%(q)s IN COALESCE(chinese_name, '')) - 1, 1)
+                                    IN (' ', '-', '.', '''') THEN 2
+                           ELSE 3
+                       END AS rank,
+                       GREATEST(similarity(lower(english_name), %(q)s),
+                                similarity(COALESCE(chinese_name, ''), %(q)s)) AS score
+                FROM teams
+                WHERE lower(english_name) LIKE '%%' || %(p)s || '%%'
+                   OR chinese_name LIKE '%%' || %(p)s || '%%'
+            ) AS matched
+            ORDER BY lower(english_name), rank, score DESC, id
+        ) AS deduplicated
+        ORDER BY rank, score DESC, lower(english_name)
+        LIMIT %(limit)s
+    """, {"q": query, "p": pattern, "limit": limit}, cache_tables=("teams",))
@@ -0,0 +1,194 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+
+# 加载 .env 文件中的环境变量
+load_dotenv()
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # 被追踪的页面运行比例，0 表示关闭，1 表示每次都追踪
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "50"))  # 每个页面保留最近多少次运行的追踪
+
+
+class Span:
+    """一段被计时的代码：墙钟时间和本线程 CPU 时间，children 为嵌套的子段"""
+
+    __slots__ = ("name", "attrs", "start", "wall", "cpu", "children", "_cpu_start")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self.wall = None
+        self.cpu = None
+        self.children = []
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.thread_time() - self._cpu_start
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "wall_ms": round(self.wall * 1000, 3),
+            "cpu_ms": round(self.cpu * 1000, 3),
+            "attrs": self.attrs,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class Trace:
+    """一次页面运行（Streamlit rerun）的追踪，根节点为整个页面"""
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.root = Span(page)
+        self.stack = [self.root]
+
+    def walk(self):
+        """按先序遍历返回 (深度, Span)"""
+        pending = [(0, self.root)]
+        while pending:
+            depth, span = pending.pop()
+            yield depth, span
+            pending.extend((depth + 1, child) for child in reversed(span.children))
+
+
+class Tracer:
+    """
+    嵌套计时段的轻量追踪器
+    每个线程同时只有一条进行中的追踪；没有进行中的追踪（未被采样）时，span() 直接返回空的上下文，
+    开销只有一次线程局部变量读取。完成的追踪按页面保留最近 history 条。
+    """
+
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, history=TRACE_HISTORY):
+        self.sample_rate = sample_rate
+        self.history = history
+        self._local = threading.local()
+        self._traces = {}  # {页面: deque[Trace]}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, page, force=False):
+        """追踪一次页面运行；按 sample_rate 采样，force 为 True 时总是追踪"""
+        if getattr(self._local, "trace", None) is not None or not (force or random.random() < self.sample_rate):
+            yield None
+            return
+        trace = Trace(page)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            # st.rerun()、st.stop() 通过异常中断脚本，这里同样会结束追踪
+            self._local.trace = None
+            trace.root.finish()
+            with self._lock:
+                self._traces.setdefault(page, deque(maxlen=self.history)).append(trace)
+
+    def span(self, name, **attrs):
+        """在当前追踪中开始一个嵌套段；当前线程没有追踪时不做任何事"""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return nullcontext()
+        return self._span(trace, name, attrs)
+
+    @contextmanager
+    def _span(self, trace, name, attrs):
+        span = Span(name, attrs)
+        trace.stack[-1].children.append(span)
+        trace.stack.append(span)
+        try:
+            yield span
+        finally:
+            span.finish()
+            trace.stack.pop()
+
+    def traced(self, name=None):
+        """装饰器：把整个函数调用记为一个段"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def page(self, name):
+        """装饰器：把函数的每次调用作为页面 name 的一次运行进行追踪（按采样率）"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.trace(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def recent(self, page=None):
+        """最近完成的追踪（旧的在前）；page 为 None 时返回所有页面"""
+        with self._lock:
+            if page is not None:
+                return list(self._traces.get(page, ()))
+            return sorted((t for traces in self._traces.values() for t in traces), key=lambda t: t.started_at)
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+trace_page = tracer.page
+
+
+def summarize(traces):
+    """
+    按段在调用树中的位置汇总多次运行：调用次数、墙钟和 CPU 总耗时、平均墙钟耗时
+    :return: 字典列表，按调用树的先序排列，段名按深度缩进
+    """
+    totals = {}
+    for trace in traces:
+        for depth, item in trace.walk():
+            path = "  " * depth + item.name
+            entry = totals.setdefault(path, {"span": path, "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            entry["calls"] += 1
+            entry["wall_ms"] += item.wall * 1000
+            entry["cpu_ms"] += item.cpu * 1000
+    rows = list(totals.values())
+    for row in rows:
+        row["avg_wall_ms"] = round(row["wall_ms"] / row["calls"], 3)
+        row["wall_ms"] = round(row["wall_ms"], 3)
+        row["cpu_ms"] = round(row["cpu_ms"], 3)
+    return rows
+
+
+def to_chrome_trace(traces):
+    """
+    导出为 Chrome Trace Event 格式（可在 chrome://tracing 或 Perfetto 中打开）
+    每次运行占一条 tid，段为 "X"（完整事件），CPU 耗时放在 args 中
+    """
+    events = []
+    for tid, trace in enumerate(traces, start=1):
+        origin = trace.root.start
+        base_us = trace.started_at * 1_000_000
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": trace.page}})
+        for _, item in trace.walk():
+            events.append({
+                "name": item.name,
+                "ph": "X",
+                "pid": 1,
+                "tid": tid,
+                "ts": round(base_us + (item.start - origin) * 1_000_000, 3),
+                "dur": round(item.wall * 1_000_000, 3),
+                "args": {"cpu_ms": round(item.cpu * 1000, 3), **{k: str(v) for k, v in item.attrs.items()}},
+            })
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
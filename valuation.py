@@ -0,0 +1,120 @@
+import math
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Arrow decimal128 的最大精度，超过后改用 decimal256
+DECIMAL128_MAX_PRECISION = 38
+DECIMAL256_MAX_PRECISION = 76
+# 构建数组时默认使用的类型：整数部分最多 10 位、8 位小数，两列相乘仍在 decimal128 范围内
+VALUE_TYPE = pa.decimal128(18, 8)
+
+
+def decimal_array(values, type=VALUE_TYPE):
+    """
+    把一列数值（Decimal、float 或 None）转换成精确的 Arrow decimal 数组，不在 Python 中逐个元素转换
+    Decimal 列按 type 直接构建；位数或小数位超出 type 时改为按实际值推断精度。
+    float 列（报价）只对不重复的值做 Decimal(str(x))，与页面上原来的 Decimal(str(x)) 结果完全一致。
+    """
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Decimal 与 float 混在同一列（很少见），只能逐个转换
+        return pa.array([None if v is None else (v if isinstance(v, Decimal) else Decimal(str(v))) for v in values])
+    if pa.types.is_floating(array.type):
+        distinct = pc.drop_null(pc.unique(array))
+        exact = pa.array([Decimal(str(v)) if math.isfinite(v) else None for v in distinct.to_pylist()])
+        if pa.types.is_null(exact.type):
+            exact = exact.cast(type)
+        return pc.take(exact, pc.index_in(array, value_set=distinct))
+    if pa.types.is_null(array.type):
+        return array.cast(type)
+    return array
+
+
+def _multiply(a, b):
+    """精确相乘：结果精度为两者之和加一，超出 decimal128 时先升级为 decimal256"""
+    precision = a.type.precision + b.type.precision + 1
+    if precision > DECIMAL256_MAX_PRECISION:
+        raise ValueError(f"数值位数过多，无法精确计算（需要 {precision} 位）")
+    if precision > DECIMAL128_MAX_PRECISION:
+        a = a.cast(pa.decimal256(a.type.precision, a.type.scale))
+        b = b.cast(pa.decimal256(b.type.precision, b.type.scale))
+    return pc.multiply(a, b)
+
+
+def _subtract(a, b):
+    """精确相减：结果精度为两者整数位和小数位的较大值之和加一，超出 decimal128 时先升级为 decimal256"""
+    scale = max(a.type.scale, b.type.scale)
+    precision = max(a.type.precision - a.type.scale, b.type.precision - b.type.scale) + scale + 1
+    if precision > DECIMAL256_MAX_PRECISION:
+        raise ValueError(f"数值位数过多，无法精确计算（需要 {precision} 位）")
+    if precision > DECIMAL128_MAX_PRECISION:
+        a = a.cast(pa.decimal256(a.type.precision, a.type.scale))
+        b = b.cast(pa.decimal256(b.type.precision, b.type.scale))
+    return pc.subtract(a, b)
+
+
+def value_positions(quantity, cost, current_price):
+    """
+    批量计算持仓的当前价值、盈亏和收益率
+    :param quantity: 每行的数量
+    :param cost: 每行的成本
+    :param current_price: 每行的当前价格，取不到价格的行为 None
+    :return: pyarrow.Table，列为 cost、current_value、pnl（精确 decimal）和 roi（百分比，float64）
+             缺少输入的行对应 null
+    """
+    cost = decimal_array(cost)
+    current_value = _multiply(decimal_array(current_price), decimal_array(quantity))
+    pnl = _subtract(current_value, cost)
+    cost_float = pc.cast(cost, pa.float64())
+    roi = pc.if_else(
+        pc.not_equal(cost_float, 0.0),
+        pc.multiply(pc.divide(pc.cast(pnl, pa.float64()), cost_float), 100.0),
+        pa.scalar(None, pa.float64())
+    )
+    return pa.table({"cost": cost, "current_value": current_value, "pnl": pnl, "roi": roi})
+
+
+def value_lots(quantity, buy_price, current_price):
+    """按笔计算：成本为 buy_price * quantity，其余同 value_positions"""
+    quantity = decimal_array(quantity)
+    return value_positions(quantity, _multiply(decimal_array(buy_price), quantity), current_price)
+
+
+def value_returns(amount, return_amount):
+    """
+    批量计算博彩等记录的净收益和收益率
+    :return: pyarrow.Table，列为 net_profit（精确 decimal）和 roi（百分比，float64）
+    """
+    amount = decimal_array(amount)
+    net_profit = _subtract(decimal_array(return_amount), amount)
+    amount_float = pc.cast(amount, pa.float64())
+    roi = pc.if_else(
+        pc.not_equal(amount_float, 0.0),
+        pc.multiply(pc.divide(pc.cast(net_profit, pa.float64()), amount_float), 100.0),
+        pa.scalar(None, pa.float64())
+    )
+    return pa.table({"net_profit": net_profit, "roi": roi})
+
+
+def decimal_sum(array, mask=None):
+    """
+    精确求和，忽略 null；mask 为布尔数组时只累加对应位置为 True 的行
+    :return: Decimal，没有可累加的值时为 Decimal("0")
+    """
+    if mask is not None:
+        array = pc.filter(array, mask if isinstance(mask, (pa.Array, pa.ChunkedArray)) else pa.array(mask, type=pa.bool_()))
+    # 放宽到最大精度，避免累加结果超出原列的精度
+    if pa.types.is_decimal128(array.type):
+        array = array.cast(pa.decimal128(DECIMAL128_MAX_PRECISION, array.type.scale))
+    elif pa.types.is_decimal256(array.type):
+        array = array.cast(pa.decimal256(DECIMAL256_MAX_PRECISION, array.type.scale))
+    total = pc.sum(array).as_py()
+    return total if total is not None else Decimal("0")